@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# benchmarks for wiktionaryparse.py - microbenchmarks for the hot functions, and whole parses of a synthetic dump.
+# Run it as a script (--help for options); --save-baseline records the results for later runs to be compared against.
+import os
+import sys
+import bz2
+import json
+import random
+import timeit
+import hashlib
+import argparse
+import tempfile
+import queue
+import multiprocessing as mp
+import wiktionaryparse as wp
+import labeltest
+
+try:
+	import resource
+except ImportError:
+	# not available on Windows - peak memory just isn't reported there
+	resource = None
+
+# the original character-by-character removeFormatting, kept around as a reference point
+def removeFormattingReference(w):
+	w = w.replace('[[','').replace(']]','').replace('\'\'\'','').replace('\'\'','')
+	w = w.replace('&lt;', '<').replace('&gt;', '>')
+	w2 = ''
+
+	# remove </text> from end
+	if(w.endswith('</text>')):
+		w = w[:-7]
+
+	# remove pairs (apple|Apple) or lang (apple#Latin)
+	rem = False
+	depth = 0
+	pendingTagClose = False
+	for i in range(len(w)):
+		c = w[i]
+		if(pendingTagClose):
+			if(c == '>'):
+				pendingTagClose = False
+				continue
+
+		if(c == '/' and w[i-1] == '<'):
+			depth-=2
+			if(depth == 0):
+				pendingTagClose = True
+				continue
+		if(c == '<'):
+			depth+=1
+			continue
+
+		if(depth > 0):
+			continue
+
+		if(rem):
+			if(c in wp.stops):
+				w2 += c
+				rem = False
+			continue
+		if(c == '|' or c == '#'):
+			rem = True
+			continue
+		w2 += c
+	return w2
+
+# the kind of text removeFormatting gets fed on a real dump - definitions, labels and plurals
+definitionLines = [
+	'A small [[domesticated]] [[carnivorous]] [[mammal]] with soft fur, a short snout, and retractable claws, \'\'[[Felis catus]]\'\'.',
+	'Any member of the [[family]] [[Felidae]]; a [[feline]].',
+	'To [[move]] [[swiftly]] on foot so that both feet leave the ground during each [[stride]].',
+	'[[happy|Happy]]; [[content]], [[satisfied]].',
+	'A [[person]] who [[run#English|runs]] a [[business]] or [[organisation|organization]].',
+	'The [[sky]] as it appears on a [[clear]] day.&lt;ref&gt;\'\'Oxford English Dictionary\'\', 2nd ed., 1989.&lt;/ref&gt;',
+	'(\'\'[[computing]]\'\') A [[file]] containing [[data]] in a [[format]] that a [[program]] can [[read]].',
+	'Of or relating to the [[Moon]].',
+	'[[w:Cat|Cat]] (\'\'[[w:Felis|Felis]]\'\'), a genus of small cats.',
+	'To [[cause]] to [[go|go]] [[away]]; to [[dismiss]].</text>',
+	'transitive',
+	'[[botany]]',
+	'chiefly',
+	'UK',
+	'figurative',
+	'mice',
+	'[[geese]]',
+	'An \'\'\'emphasised\'\'\' word.',
+]
+
+# the labels out of {{lb|en|...}} templates that handleLabels gets
+labelLines = [
+	('transitive',),
+	('intransitive', 'figurative'),
+	('chiefly', 'UK', 'Australia'),
+	('sometimes', 'figurative'),
+	('obsolete', '_', 'slang'),
+	('countable', 'uncountable'),
+	('[[botany]]',),
+	('usually', 'plural', '_', 'informal'),
+]
+
+# definitions as cleanDef gets them - after the # and any {{lb}} labels
+cleanDefLines = [
+	'A small [[domesticated]] [[mammal]], \'\'[[Felis catus]]\'\'.',
+	'{{alternative form of|en|colour}}',
+	'{{plural of|en|[[mouse]]}}',
+	'{{n-g|Used to express surprise.}}',
+	'{{given name|male|or=female}}',
+	'{{taxlink|Felis|genus}} cats',
+	'{{surname|en}}',
+	'{{senseid|en|Q146}} A [[cat]].',
+	'{{unknown template|en|x}} Something else.',
+	'To [[run]] [[quickly]]. {{m|en|sprint|to sprint}}',
+]
+
+# whole definition lines, as the parser sees them
+definitionLineLines = [
+	'# {{lb|en|transitive|figurative}} To [[run]] [[quickly]].',
+	'# A small [[domesticated]] [[mammal]], \'\'[[Felis catus]]\'\'.',
+	'## {{lb|en|chiefly|UK|Australia}} {{plural of|en|[[mouse]]}}',
+	'# {{lb|en|[[botany]]|{{w|UK}}}} A [[plant]]. {{m|en|shrub|a shrub}}',
+]
+
+# plural rule lines
+pluralLines = ['{{en-noun}}', '{{en-noun|es}}', '{{en-noun|[[mice]]|s}}', '{{en-verb|runs|running|ran|run}}', '{{en-noun|{{l|en|oxen}}|~}}']
+
+# whole templates labelify splits into their arguments
+labelifyLines = ['{{lb|en|transitive|figurative}}', '{{en-noun|es}}', '{{lb|en|[[botany]]|{{w|UK}}}}', '{{en-noun|{{l|en|oxen}}|~}}']
+
+# everything the parser does with a definition line - the label and definition extraction share one WikiLine
+def extractDefinition(line):
+	line = wp.WikiLine(line)
+	labels, start = wp.definitionParts(line)
+	return (wp.cleanDef(line, start), wp.handleLabels(labels) if labels else None)
+
+def extractPlurals(line):
+	return wp.pluralArgs(wp.WikiLine(line))
+
+def cleanDefLine(d):
+	return wp.cleanDef(wp.WikiLine(d))
+
+# nested template text formatTerm unwraps
+formatTermLines = ['a{{b}}{{c}}{{d{{e{{{{f}}}}}}}}', '{{l|en|cat}}', 'a [[b]] {{c|[[d]]}}', 'plain text without any groups']
+# pathological nesting - these take time linear in their length
+nestedLines = ['{{' * 500 + 'x' + '}}' * 500, '[[' * 1000 + 'unclosed', '{{a|' * 300 + ']]' * 300]
+
+# derived term lines, with their leading * or | taken off
+derivedLines = [' {{l|en|catgut}}', ' [[cat burglar]]', 'catfish', ' {{l|en|[[cat]]s}} {{q|plural}}', ' [[cat#English|cat]]nap']
+
+# times fn over every sample line - returns the best of a few runs, in seconds
+def timeLines(fn, lines, number):
+	return min(timeit.repeat(lambda: [fn(l) for l in lines], number=number, repeat=5))
+
+# times fn over every sample line - returns microseconds per call
+def timePerCall(fn, lines, number):
+	return timeLines(fn, lines, number) / (number * len(lines)) * 1e6
+
+# compares removeFormatting against the reference - returns microseconds per call, or None if the outputs differ
+def benchRemoveFormatting(number=2000):
+	for line in definitionLines:
+		if(removeFormattingReference(line) != wp.removeFormatting(line)):
+			print('removeFormatting output differs from the reference on: ' + line)
+			return None
+	old = timeLines(removeFormattingReference, definitionLines, number)
+	new = timeLines(wp.removeFormatting, definitionLines, number)
+	calls = number * len(definitionLines)
+	print('removeFormatting: reference ' + str(round(old / calls * 1e6, 2)) + 'us/call, current ' +
+		str(round(new / calls * 1e6, 2)) + 'us/call (' + str(round(old / new, 1)) + 'x faster)')
+	return new / calls * 1e6
+
+# the other functions microbenchmarked, with the lines to feed them
+microbenchmarks = [
+	('handleLabels', wp.handleLabels, labelLines),
+	('cleanDef', cleanDefLine, cleanDefLines),
+	('definition line', extractDefinition, definitionLineLines),
+	('plural line', extractPlurals, pluralLines),
+	('labelify', wp.labelify, labelifyLines),
+	('formatTerm', labeltest.formatTerm, formatTermLines),
+	('formatTerm (nested)', labeltest.formatTerm, nestedLines),
+	('cleanDerivedTerm', wp.cleanDerivedTerm, derivedLines),
+]
+
+# runs every microbenchmark - returns {name: microseconds per call}
+def benchFunctions(number=2000):
+	results = {}
+	perCall = benchRemoveFormatting(number)
+	if(perCall is not None):
+		results['removeFormatting us/call'] = perCall
+	for name, fn, lines in microbenchmarks:
+		perCall = timePerCall(fn, lines, number)
+		print(name + ': ' + str(round(perCall, 2)) + 'us/call')
+		results[name + ' us/call'] = perCall
+	# again with the normalization caches turned on
+	wp.setNormalizationCache(wp.defaultNormalizationCacheSize)
+	for name, lines in (('removeFormatting', definitionLines), ('handleLabels', labelLines)):
+		perCall = timePerCall(getattr(wp, name), lines, number)
+		print(name + ' (cached): ' + str(round(perCall, 2)) + 'us/call')
+		results[name + ' (cached) us/call'] = perCall
+	wp.setNormalizationCache(0)
+	return results
+
+# languages a synthetic dump's entries are in, and how often
+defaultLanguages = {'English': 6, 'French': 1, 'Latin': 1, 'Translingual': 1, 'Old English': 1}
+# sections entries are made of - parts of speech get definitions, the rest get lists or prose
+syntheticSections = ['Noun', 'Verb', 'Adjective', 'Adverb', 'Pronunciation', 'Etymology', 'Derived terms', 'Synonyms']
+syntheticHeads = {
+	'Noun': ['{{en-noun}}', '{{en-noun|es}}', '{{en-noun|~}}', '{{en-noun|-}}', '{{en-noun|[[mice]]|s}}', '{{en-noun|?}}'],
+	'Verb': ['{{en-verb}}', '{{en-verb|es}}', '{{en-verb|ies}}', '{{en-verb|d}}'],
+	'Adjective': ['{{en-adj}}', '{{en-adj|er}}', '{{en-adj|-}}'],
+}
+syntheticLabels = ['transitive', 'intransitive', 'chiefly|UK|Australia', 'sometimes|figurative', 'obsolete|_|slang',
+	'countable|uncountable', '[[botany]]', 'usually|plural']
+# templates a definition can start with - %s is filled in with another word
+syntheticTemplates = ['{{alternative form of|en|%s}}', '{{plural of|en|%s}}', '{{n-g|Used as a %s.}}',
+	'{{given name|male|or=female}}', '{{surname|en}}', '{{taxlink|Felis|genus}} cats', '{{senseid|en|Q1}} A [[%s]].',
+	'{{inflection of|%s||s|indc}}', '{{m|en|%s}}']
+syntheticSyllables = ['ca', 'do', 'ru', 'ha', 'pe', 'bo', 'fly', 'tre', 'mou', 'sky', 'ston', 'ar', 'le', 'in', 'ous', 'ing', 'er']
+
+pageXML = '''  <page>
+    <title>{title}</title>
+    <ns>{ns}</ns>
+    <id>{id}</id>
+    <revision>
+      <id>{revision}</id>
+      <timestamp>2020-01-01T00:00:00Z</timestamp>
+      <contributor>
+        <username>Bench</username>
+        <id>1</id>
+      </contributor>
+      <model>wikitext</model>
+      <format>text/x-wiki</format>
+      <text xml:space="preserve">{text}</text>
+      <sha1>{sha1}</sha1>
+    </revision>
+  </page>
+'''
+
+def syntheticDefinition(r, words, templateDensity):
+	line = '# '
+	if(r.random() < 0.4):
+		line += '{{lb|en|' + r.choice(syntheticLabels) + '}} '
+	if(r.random() < templateDensity):
+		template = r.choice(syntheticTemplates)
+		return line + (template % r.choice(words) if '%s' in template else template)
+	line += 'A [[' + r.choice(words) + '|' + r.choice(words) + ']] \'\'\'' + r.choice(words) + '\'\'\' [[' + r.choice(words) + '#English|thing]].'
+	if(r.random() < 0.2):
+		line += '&lt;ref&gt;Some book, p. ' + str(r.randint(1, 300)) + '&lt;/ref&gt;'
+	return line
+
+def syntheticEntry(r, word, words, languages, templateDensity):
+	names = list(languages)
+	weights = [languages[name] for name in names]
+	langs = []
+	for i in range(r.choice((1, 1, 1, 2, 3))):
+		lang = r.choices(names, weights)[0]
+		if(lang not in langs):
+			langs.append(lang)
+	parts = []
+	for lang in langs:
+		lines = ['==' + lang + '==']
+		for section in r.sample(syntheticSections, r.randint(1, 4)):
+			marks = '===' if r.random() < 0.7 else '===='
+			lines.append(marks + section + marks)
+			if(section in syntheticHeads):
+				lines.append(r.choice(syntheticHeads[section]))
+				lines.append('')
+				for i in range(r.randint(1, 4)):
+					lines.append(syntheticDefinition(r, words, templateDensity))
+					if(r.random() < 0.3):
+						lines.append('#: An example using ' + word + '.')
+			elif(section in ('Derived terms', 'Synonyms')):
+				lines.append('* {{l|en|' + r.choice(words) + '}}')
+				lines.append('* [[' + r.choice(words) + ']]')
+			elif(section == 'Pronunciation'):
+				lines.append('* {{IPA|en|/' + word + '/}}')
+			else:
+				lines.append('From {{inh|en|enm|' + r.choice(words) + '}}, a word.')
+		parts.append('\n'.join(lines))
+	return '\n\n----\n\n'.join(parts) + '\n\n[[fr:' + word + ']]'
+
+# writes a synthetic pages-articles dump to path (bz2 compressed if the path ends in .bz2) - returns the number of pages.
+# languages maps language names to how often entries are in them, templateDensity is the fraction of definitions
+# that start with a template, and metaFraction is the fraction of pages outside the main namespace.
+def generateDump(path, pageCount, languages=None, templateDensity=0.3, metaFraction=0.15, seed=1):
+	r = random.Random(seed)
+	languages = languages or defaultLanguages
+	words = []
+	seen = set()
+	while(len(words) < max(pageCount, 1)):
+		word = ''.join(r.choice(syntheticSyllables) for i in range(r.randint(1, 3)))
+		if(word in seen):
+			word += str(len(words))
+		seen.add(word)
+		words.append(word)
+
+	opener = bz2.open if path.endswith('.bz2') else open
+	with opener(path, 'wt', encoding='utf-8') as f:
+		f.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10" xml:lang="en">\n' +
+			'  <siteinfo>\n    <sitename>Wiktionary</sitename>\n  </siteinfo>\n')
+		for i in range(pageCount):
+			if(r.random() < metaFraction):
+				title = r.choice(('Template:', 'Appendix:', 'Thesaurus:', 'Wiktionary:')) + words[i]
+				ns = 10
+				text = '{{documentation}}\nSee [[' + r.choice(words) + ']].'
+			else:
+				title = words[i]
+				ns = 0
+				text = syntheticEntry(r, title, words, languages, templateDensity)
+			f.write(pageXML.format(title=title, ns=ns, id=i + 1, revision=i * 7 + 1, text=text,
+				sha1=hashlib.sha1(text.encode('utf-8')).hexdigest()))
+		f.write('</mediawiki>\n')
+	return pageCount
+
+# settings for each whole-parse benchmark
+parseModes = {
+	'full': lambda parser: None,
+	'words-only': lambda parser: parser.setWordsOnly(True),
+	'nouns-with-plurals': lambda parser: (parser.setTargetSections('Noun'), parser.setTrackDefinitions(False), parser.setTrackDerived(False)),
+}
+
+# peak memory of this process, in MB - None where it can't be found
+def peakMemory():
+	if(resource is None):
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# kilobytes everywhere but macOS, which gives bytes
+	return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+# seconds between checks on a parse's process while waiting for its results
+parsePollInterval = 1.0
+
+# parses the dump in one of parseModes and puts the results on resultQueue - run in its own process, so peak memory is its own
+def runParse(mode, dumpPath, outPath, resultQueue):
+	sys.stdout = open(os.devnull, 'w')
+	parser = wp.WiktionaryParser(dumpPath, outPath)
+	parser.setMaxPageCount(sys.maxsize)
+	parser.setTrackSelf(False)
+	# streamed, so memory use is the parser's rather than the output's
+	parser.setStreamOutput(True)
+	parseModes[mode](parser)
+	stats = parser.parse()
+	resultQueue.put({
+		mode + ' pages/s': stats.pagesPerSecond(),
+		mode + ' MB/s': stats.megabytesPerSecond(),
+		mode + ' peak RSS MB': peakMemory(),
+	})
+
+# the results a parse's process puts on resultQueue - None if the process ends without putting any (it crashed)
+def parseResults(process, resultQueue):
+	while(True):
+		try:
+			return resultQueue.get(timeout=parsePollInterval)
+		except queue.Empty:
+			if(process.exitcode is not None):
+				# it may have put them just before it ended
+				try:
+					return resultQueue.get_nowait()
+				except queue.Empty:
+					return None
+
+# parses the dump once in each of parseModes - returns {name: result}. Modes whose parse crashes are left out.
+def benchParses(dumpPath, outDir):
+	results = {}
+	for mode in parseModes:
+		resultQueue = mp.Queue()
+		process = mp.Process(target=runParse, args=(mode, dumpPath, os.path.join(outDir, mode + '.out'), resultQueue))
+		process.start()
+		modeResults = parseResults(process, resultQueue)
+		process.join()
+		if(modeResults is None):
+			print(mode + ': the parse failed (exit code ' + str(process.exitcode) + ')')
+			continue
+		rss = modeResults[mode + ' peak RSS MB']
+		print(mode + ': ' + str(round(modeResults[mode + ' pages/s'])) + ' pages/s, ' +
+			str(round(modeResults[mode + ' MB/s'], 2)) + ' MB/s' + ('' if rss is None else ', peak RSS ' + str(round(rss, 1)) + 'MB'))
+		results.update((name, value) for name, value in modeResults.items() if value is not None)
+	return results
+
+# prints how results compare to a baseline - rates (/s) are better higher, times and memory are better lower
+def compareResults(results, baseline):
+	print('Compared to baseline:')
+	for name, value in results.items():
+		old = baseline.get(name)
+		if(not old):
+			continue
+		change = (value - old) / old * 100
+		better = change > 0 if name.endswith('/s') else change < 0
+		print('  ' + name + ': ' + str(round(value, 2)) + ' vs ' + str(round(old, 2)) + ' (' +
+			('+' if change >= 0 else '') + str(round(change, 1)) + '%, ' + ('same' if change == 0 else 'better' if better else 'worse') + ')')
+
+def main():
+	args = argparse.ArgumentParser(description='Benchmarks wiktionaryparse.py.')
+	args.add_argument('--pages', type=int, default=20000, help='pages in the synthetic dump (default 20000)')
+	args.add_argument('--seed', type=int, default=1, help='seed for the synthetic dump')
+	args.add_argument('--template-density', type=float, default=0.3, help='fraction of definitions starting with a template')
+	args.add_argument('--dump', help='benchmark parsing this dump instead of a synthetic one')
+	args.add_argument('--generate', metavar='PATH', help='only write a synthetic dump to PATH (.xml or .xml.bz2)')
+	args.add_argument('--number', type=int, default=2000, help='loops over the samples per microbenchmark run')
+	args.add_argument('--baseline', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark-baseline.json'),
+		help='baseline file to compare against')
+	args.add_argument('--save-baseline', action='store_true', help='save these results as the baseline')
+	args = args.parse_args()
+
+	if(args.generate):
+		generateDump(args.generate, args.pages, templateDensity=args.template_density, seed=args.seed)
+		return
+
+	results = benchFunctions(args.number)
+	with tempfile.TemporaryDirectory() as tmp:
+		dumpPath = args.dump
+		if(not dumpPath):
+			dumpPath = os.path.join(tmp, 'synthetic.xml')
+			generateDump(dumpPath, args.pages, templateDensity=args.template_density, seed=args.seed)
+		results.update(benchParses(dumpPath, tmp))
+
+	if(args.save_baseline):
+		with open(args.baseline, 'w') as f:
+			json.dump(results, f, indent='\t', sort_keys=True)
+		print('Saved baseline to ' + args.baseline)
+	elif(os.path.exists(args.baseline)):
+		with open(args.baseline) as f:
+			compareResults(results, json.load(f))
+
+if __name__ == '__main__':
+	main()
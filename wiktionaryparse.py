@@ -1,22 +1,43 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import re
+import io
+import sys
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import time
 import json
+import zlib
+import html
+import mmap
+import sqlite3
+import array
+import struct
+import functools
+import heapq
+import cProfile
+import threading
+import queue
+import multiprocessing as mp
 import collections as cl
 
 # matches to Language titles
 title2PT = re.compile('==([^=]+)==')
 # matches to section/subsection titles
 title3pPT = re.compile('={3,}([^=]+)(={3,})')
-# matches plural rule labels for any language - groups the inner contents
-plrre = re.compile('{{([a-z]{2,3}-(?:noun|verb).*?)}}')
-# matches definitions - extracts first set of labels and definition
-defre1 = re.compile('#+? (?:{{lbl?\|[a-z]{2,3}\|(?P<labels>.+?)}} ?)?(?P<def>.+)')
-# matches definitions - extracts pre/post labels and definition
-defre2 = re.compile('^(?:{{(?P<prelabels>.+?)}} ?)?(?P<def>[^{]*)(?:{{(?P<postlabels>.+)}})?')
+# matches the names of plural rule templates for any language - {{en-noun|...}}
+pluralTemplatePT = re.compile('[a-z]{2,3}-(?:noun|verb)')
+# match the names of the English verb and adjective headword templates - {{en-verb|...}}, {{en-adj|...}}
+verbTemplatePT = re.compile('en-verb')
+adjectiveTemplatePT = re.compile('en-adj')
+# matches language codes - en, fr, ang
+langCodePT = re.compile('[a-z]{2,3}')
 
 # sections that should be represented by a list instead of a dict
-listSects = ['Derived terms']
+listSects = ['Derived terms', 'Synonyms']
 
 # levels of countability corresponding with indices 0,1,2
 countableTypes = ['No', 'Yes', 'Sometimes', 'Unknown']
@@ -24,19 +45,227 @@ partsOfSpeech = {'Adjective', 'Adverb', 'Ambiposition', 'Article', 'Circumpositi
 	'Classifier', 'Conjunction', 'Contraction', 'Counter', 'Determiner', 'Ideophone',
 	'Interjection', 'Noun', 'Numeral', 'Participle', 'Particle', 'Postposition',
 	'Preposition', 'Pronoun', 'Proper noun', 'Verb'}
+# the markup parseWikitext splits lines up by - groups with nothing nested in them are matched whole
+wikiTokenPT = re.compile(r'\{\{[^{}\[\]]*\}\}|\[\[[^{}\[\]]*\]\]|\{\{|\}\}|\[\[|\]\]')
+
+# a {{template}} or [[link]] in a line of wikitext, along with the groups nested inside it - a line's root group has no kind.
+# start/end are where the group is in the text, delimiters included. Groups never closed are left with no end, and are just text.
+class WikiNode():
+	__slots__ = ('kind', 'start', 'end', 'children')
+
+	def __init__(self, kind, start, end=None):
+		self.kind = kind	# '{{', '[[' or None for the root
+		self.start = start
+		self.end = end
+		self.children = []
+
+	# where the group's content (everything between its delimiters) starts and ends
+	def contentStart(self):
+		return self.start + 2 if self.kind else self.start
+
+	def contentEnd(self):
+		return self.end - 2 if self.kind else self.end
+
+	# (start, end) of each of the group's arguments - split by the |s in it that aren't inside nested groups
+	def argSpans(self, text):
+		spans = []
+		start = pos = self.contentStart()
+		end = self.contentEnd()
+		for child in self.children:
+			pipe = text.find('|', pos, child.start)
+			while(pipe >= 0):
+				spans.append((start, pipe))
+				start = pipe + 1
+				pipe = text.find('|', start, child.start)
+			# anything after a group that was never closed is part of it
+			if(child.end is None):
+				pos = end
+				break
+			pos = child.end
+		pipe = text.find('|', pos, end)
+		while(pipe >= 0):
+			spans.append((start, pipe))
+			start = pipe + 1
+			pipe = text.find('|', start, end)
+		spans.append((start, end))
+		return spans
+
+	# the group's arguments, as text
+	def args(self, text):
+		# with nothing nested, every | in it is its own
+		if(not self.children):
+			return text[self.contentStart():self.contentEnd()].split('|')
+		return [text[start:end] for start, end in self.argSpans(text)]
+
+# the profile of the run being profiled on each thread - None on threads whose run isn't. Runs parsed together are on
+# threads of their own, so each one's profile only gets its own calls.
+class ProfilingState(threading.local):
+	profile = None
+
+profiling = ProfilingState()
+
+# makes fn add its calls to the profile of the run on the thread calling it, if it's being profiled - see RunProfile
+def profiled(fn):
+	name = fn.__name__
+	def profiledFunction(*args):
+		profile = profiling.profile
+		if(profile is None):
+			return fn(*args)
+		return profile.call(name, fn, args)
+	return functools.update_wrapper(profiledFunction, fn)
+
+# splits a line of wikitext into its (nested) templates and links - returns the line's root WikiNode.
+# One pass over the markup with a stack of open groups, so it takes linear time however deeply (or badly) things nest.
+# Like wiktionary, any closer closes the innermost open group, and closers with nothing open are just text.
+@profiled
+def parseWikitext(text):
+	root = WikiNode(None, 0, len(text))
+	group = root
+	stack = []
+	for match in wikiTokenPT.finditer(text):
+		token = match[0]
+		if(len(token) > 2):
+			group.children.append(WikiNode(token[:2], match.start(), match.end()))
+		elif(token == '{{' or token == '[['):
+			child = WikiNode(token, match.start())
+			group.children.append(child)
+			stack.append(group)
+			group = child
+		elif(stack):
+			group.end = match.end()
+			group = stack.pop()
+	return root
+
+# a {{template}} with nothing nested in it - groups the content
+flatTemplatePT = re.compile(r'\{\{([^{}\[\]]*)\}\}')
+# plain text (and links with nothing nested in them) up to a flat {{template}} - groups the template's content
+nextFlatTemplatePT = re.compile(r'(?:[^{\[]|\{(?!\{)|\[(?!\[)|\[\[[^{}\[\]]*\]\])*\{\{([^{}\[\]]*)\}\}')
+
+# a line of wikitext, for the extractors working on it to share. Templates with nothing nested in them (nearly all of them)
+# are read straight off the text - the line only goes through parseWikitext if something nested gets in the way.
+class WikiLine():
+	__slots__ = ('text', 'root')
+
+	def __init__(self, text):
+		self.text = text
+		self.root = None
+
+	# the line's parseWikitext tree - parsed the first time it's needed
+	def tree(self):
+		if(self.root is None):
+			self.root = parseWikitext(self.text)
+		return self.root
+
+	# the closed template starting at pos (which can't be inside another group), as (start, end, arguments) - or None
+	def templateAt(self, pos):
+		text = self.text
+		if(not text.startswith('{{', pos)):
+			return None
+		match = flatTemplatePT.match(text, pos)
+		if(match):
+			return (pos, match.end(), match[1].split('|'))
+		for group in self.tree().children:
+			if(group.start >= pos):
+				if(group.start == pos and group.end is not None):
+					return (pos, group.end, group.args(text))
+				return None
+		return None
+
+	# the first closed template at or after pos (which can't be inside another group) that isn't inside another group,
+	# as (start, end, arguments) - or None
+	def nextTemplate(self, pos):
+		text = self.text
+		match = nextFlatTemplatePT.match(text, pos)
+		if(match):
+			return (match.start(1) - 2, match.end(), match[1].split('|'))
+		if(text.find('{{', pos) < 0):
+			return None
+		for group in self.tree().children:
+			if(group.start >= pos and group.kind == '{{' and group.end is not None):
+				return (group.start, group.end, group.args(text))
+		return None
+
+# renders a line of wikitext as plain text, without recursion. keep(text, group) gives the (start, end) part of a
+# closed group to keep in its place - which can have groups of its own in it - or None to drop the group.
+# Text outside of groups is kept as it is, and so are the delimiters of groups that were never closed.
+def renderWikitext(text, root, keep):
+	out = []
+	pos = root.start
+	# (group, iterator over its children, end of the part of it being kept)
+	stack = [(root, iter(root.children), root.end)]
+	while(stack):
+		group, children, end = stack[-1]
+		child = next(children, None)
+		if(child is None):
+			stack.pop()
+			# unclosed groups run to the end of the text - whatever holds them finishes them off
+			if(group.end is not None):
+				out.append(text[pos:end])
+				pos = group.end
+			continue
+		# groups outside the part being kept
+		if(child.start < pos or child.start >= end):
+			continue
+		if(child.end is None):
+			stack.append((child, iter(child.children), len(text)))
+			continue
+		out.append(text[pos:child.start])
+		span = keep(text, child)
+		if(span is None):
+			pos = child.end
+			continue
+		pos = span[0]
+		stack.append((child, iter(child.children), span[1]))
+	return ''.join(out)
+
+# keeps the content of every group - removes the delimiters
+def groupContent(text, group):
+	return (group.contentStart(), group.contentEnd())
+
 # split a string into labels {{a|b|c}}
 def labelify(s):
+	template = WikiLine(s).templateAt(0)
+	if(template and template[1] == len(s)):
+		return template[2]
 	return s[2:-2].split('|')
 
+# number of times each kind of warning has come up in this process
+warningCounts = cl.Counter()
+# only this many of each kind of warning are printed - the rest are just counted
+warningPrintLimit = 5
+
+# prints a warning about the dump's content, unless too many of its kind have been printed already
+def warn(kind, message):
+	warningCounts[kind] += 1
+	count = warningCounts[kind]
+	if(count <= warningPrintLimit):
+		print(message)
+		if(count == warningPrintLimit):
+			print('(any more ' + kind + ' warnings will only be counted)')
+
 # eg: {{sometimes|that}}
 leadingLabels = {'sometimes', 'stereotypically', 'now', 'usually'}
 # eg: {{chiefly|UK|Australia}}
 listLabels = {'chiefly'}
 
-# formats labels properly
+# formats labels properly - takes the tuple of labels out of a {{lb}} template. Any warnings about them are given
+# whether or not the labels came out of the normalization cache.
+@profiled
 def handleLabels(l):
+	if(labelsCache is None or len(l) > normalizationCacheMaxLength):
+		labels, warnings = formatLabels(l)
+	else:
+		labels, warnings = labelsCache(l)
+		labels = list(labels)
+	for kind, message in warnings:
+		warn(kind, message)
+	return labels
+
+# the work of handleLabels, without giving its warnings - returns (labels, warnings as (kind, message) pairs)
+def formatLabels(l):
 	newLabels = []
-	labels = [removeFormatting(lab) for lab in l.split('|')]
+	warnings = []
+	labels = [removeFormatting(lab) for lab in l]
 
 	currentList = None
 	currentListTitle = None
@@ -50,8 +279,12 @@ def handleLabels(l):
 			if(currentListTitle):
 				newLabels.append(currentListTitle + ', '.join(currentList))
 				currentListTitle = None
-			if(i == count-1):
-				print('Leading label error @ line: ' + l)
+			# with nothing after it to lead, it's kept on its own
+			if(i + 1 >= count):
+				warnings.append(('leading label', 'Leading label error @ line: ' + '|'.join(l)))
+				newLabels.append(lab)
+				i+=1
+				continue
 			newLabels.append(lab + ' ' + labels[i+1])
 			i+=2
 			continue
@@ -60,12 +293,15 @@ def handleLabels(l):
 			if(currentListTitle):
 				newLabels.append(currentListTitle + ', '.join(currentList))
 				currentListTitle = None
-			if(i == count-1):
-				print('Combining label error (after) @ line: ' + l)
+			# with nothing after it to combine with, it's dropped
+			if(i + 1 >= count):
+				warnings.append(('combining label', 'Combining label error (after) @ line: ' + '|'.join(l)))
+				i+=1
+				continue
 
 			prev = None
 			if(len(newLabels) == 0):
-				print('Combining label error (before) @ line: ' + l)
+				warnings.append(('combining label', 'Combining label error (before) @ line: ' + '|'.join(l)))
 				prev = ''
 			else:
 				prev = newLabels.pop()
@@ -93,26 +329,66 @@ def handleLabels(l):
 	if(currentListTitle):
 		newLabels.append(currentListTitle + ', '.join(currentList))
 
-	return newLabels
+	return (newLabels, tuple(warnings))
 
 # remove bolded / linked words
-# should probably make this more efficient later
 stops = set(',.;-~/()')
+# a pipe (apple|Apple) or lang (apple#Latin) section - runs up to the next stop
+pipedPT = re.compile('[|#][^,.;~/()\\-]*')
+# characters that need a look one at a time once tags are involved - everything between them is handled in bulk
+formatSpecialsPT = re.compile('[<>/|#]')
+stopsPT = re.compile('[,.;~/()\\-]')
 
+@profiled
 def removeFormatting(w):
- 	w = w.replace('[[','').replace(']]','').replace('\'\'\'','').replace('\'\'','')
-	w = w.replace('&lt;', '<').replace('&gt;', '>')
-	w2 = ''
+	if(formattingCache is None or len(w) > normalizationCacheMaxLength):
+		return stripFormatting(w)
+	return formattingCache(w)
+
+# the work of removeFormatting, without the normalization cache
+def stripFormatting(w):
+	if('[' in w or ']' in w):
+		w = w.replace('[[','').replace(']]','')
+	if('\'' in w):
+		w = w.replace('\'\'\'','').replace('\'\'','')
+	if('&' in w):
+		w = w.replace('&lt;', '<').replace('&gt;', '>')
 
 	# remove </text> from end
 	if(w.endswith('</text>')):
 		w = w[:-7]
 
-	# remove pairs (apple|Apple) or lang (apple#Latin)
+	if('<' in w):
+		return removeTaggedFormatting(w)
+	# with no tags around, all that's left is removing pairs (apple|Apple) or lang (apple#Latin)
+	if('|' in w or '#' in w):
+		return pipedPT.sub('', w)
+	return w
+
+# the tag-aware half of removeFormatting - removes <tags> and their contents along with pairs/langs.
+# Steps through the string one special character at a time, keeping or dropping the plain runs between them whole.
+def removeTaggedFormatting(w):
+	w2 = []
 	rem = False
 	depth = 0
 	pendingTagClose = False
-	for i in range(len(w)):
+	last = 0
+	specials = [m.start() for m in formatSpecialsPT.finditer(w)]
+	specials.append(len(w))
+	for i in specials:
+		# the plain run before this character
+		if(last < i and depth <= 0):
+			if(rem):
+				stop = stopsPT.search(w, last, i)
+				if(stop):
+					w2.append(w[stop.start():i])
+					rem = False
+			else:
+				w2.append(w[last:i])
+		last = i + 1
+		if(i == len(w)):
+			break
+
 		c = w[i]
 		if(pendingTagClose):
 			if(c == '>'):
@@ -133,28 +409,428 @@ def removeFormatting(w):
 
 		if(rem):
 			if(c in stops):
-				w2 += c
+				w2.append(c)
 				rem = False
 			continue
 		if(c == '|' or c == '#'):
 			rem = True
 			continue
-		w2 += c
-	return w2
+		w2.append(c)
+	return ''.join(w2)
 
 def cleanInnerDef(d):
 	pass
 
-# formats a definition properly - returns (formatted def, tags to add)
-def cleanDef(d):
-	match = defre2.match(d)
-	defi = removeFormatting(match.group('def'))
-	prelabels = match.group('prelabels')
-	postlabels = match.group('postlabels')
+# templates that just link to a term - {{l|en|term}}
+linkTemplates = {'l', 'll', 'l-self', 'link', 'm', 'mention'}
+
+# the part of a template or link in a derived term that's shown - a link's target without its #Language, the term of a
+# link template. Any other templates are dropped.
+def derivedTermPart(text, group):
+	spans = group.argSpans(text)
+	if(group.kind == '[['):
+		start, end = spans[0]
+		hashAt = text.find('#', start, end)
+		return (start, end if hashAt < 0 else hashAt)
+	start, end = spans[0]
+	if(len(spans) > 2 and text[start:end].strip() in linkTemplates):
+		return spans[2]
+	return None
+
+# cleans up a line listing a derived term, leading * or | and all - * {{l|en|catgut}} becomes catgut. root is the line's
+# parseWikitext tree, if it's been split up already.
+@profiled
+def cleanDerivedTerm(line, root=None):
+	if('{' not in line and '[' not in line):
+		return removeFormatting(line[1:]).strip()
+	return removeFormatting(renderWikitext(line, root or parseWikitext(line), derivedTermPart)[1:]).strip()
+
+# templates listing terms in columns - {{der3|en|cat|dog}}, {{col-auto|en|...}}. They often run over several lines,
+# one |term to a line.
+columnTemplatePT = re.compile(r'(?:der|rel|col)[1-5]?(?:-u|-auto)?')
+# a named template argument - title=, sort=
+namedArgPT = re.compile(r'\s*[\w-]+\s*=')
+
+# the terms in a column template's arguments, leaving out named ones and any that come out empty
+def columnTerms(args):
+	terms = (cleanDerivedTerm('|' + arg) for arg in args if not namedArgPT.match(arg))
+	return [term for term in terms if term]
+
+# the terms listed on a line of a derived terms or synonyms section. A * line gives its term - or one for each link on
+# it, when it has several - and a column template (or a | line carrying one on) each of the terms it lists. Lines that
+# leave no term behind ({{q|rare}}) give none.
+def listedTerms(line):
+	body = line[1:].strip() if line[0] == '*' else line
+	if(body.startswith('{{')):
+		# a template running on to the next lines is closed off here, for the arguments on this one
+		template = WikiLine(body).templateAt(0) or WikiLine(body + '}}').templateAt(0)
+		if(template is None):
+			return []
+		args = template[2]
+		if(columnTemplatePT.fullmatch(args[0].strip())):
+			# the first argument is the language
+			return columnTerms(args[2:])
+		# any other template on a line of its own isn't a term
+		if(line[0] == '{'):
+			return []
+	elif(line[0] == '|'):
+		# more of a column template's arguments - usually just the one
+		template = WikiLine('{{' + line + '}}').templateAt(0)
+		if(template is None):
+			return []
+		return columnTerms(template[2][1:])
+	if('{' not in line and '[' not in line):
+		term = cleanDerivedTerm(line)
+		return [term] if term else []
+	root = parseWikitext(line)
+	# * {{l|en|cat}}, {{l|en|kitty}} - a term for each link, and nothing for the qualifiers and commas around them
+	links = [group for group in root.children if group.end is not None and derivedTermPart(line, group) is not None]
+	if(len(links) > 1):
+		terms = (cleanDerivedTerm('*' + line[group.start:group.end]) for group in links)
+		return [term for term in terms if term]
+	term = cleanDerivedTerm(line, root)
+	return [term] if term else []
+
+# the LRU caches removeFormatting and handleLabels look their results up in - None while caching is off. They cache
+# the pure work (stripFormatting, formatLabels), so handleLabels still gives its warnings on a hit.
+formattingCache = None
+labelsCache = None
+# the caches, by the name of the function they're in front of
+normalizationCaches = {}
+# number of results each normalization cache keeps - 0 when they're off, which they are unless they're turned on
+normalizationCacheSize = 0
+# a good size for the caches when they're turned on
+defaultNormalizationCacheSize = 1 << 15
+# longer inputs skip the caches - they're mostly whole definitions, which hardly ever come up twice
+normalizationCacheMaxLength = 64
+
+# puts an LRU cache holding size results in front of removeFormatting and handleLabels (0 to take them away).
+# The same labels, template arguments and plural rules come up over and over, so most calls to them become lookups.
+def setNormalizationCache(size):
+	global formattingCache, labelsCache, normalizationCacheSize
+	if(size == normalizationCacheSize):
+		return
+	normalizationCacheSize = size
+	normalizationCaches.clear()
+	if(size):
+		formattingCache = normalizationCaches['removeFormatting'] = functools.lru_cache(size)(stripFormatting)
+		labelsCache = normalizationCaches['handleLabels'] = functools.lru_cache(size)(formatLabels)
+	else:
+		formattingCache = None
+		labelsCache = None
+
+# hits and misses of the normalization caches so far, as a Counter of '<function> hits'/'<function> misses'
+def normalizationCacheInfo():
+	info = cl.Counter()
+	for name, cache in normalizationCaches.items():
+		hits, misses, maxsize, currsize = cache.cache_info()
+		info[name + ' hits'] = hits
+		info[name + ' misses'] = misses
+	return info
+
+# the argument a template is about, after its language code if it starts with one - {{plural of|en|mouse}} and the
+# older {{plural of|mouse|lang=en}} both give mouse. None if there isn't one.
+def templateTarget(args):
+	if(len(args) < 2):
+		return None
+	if(len(args) > 2 and args[2] and '=' not in args[2] and langCodePT.fullmatch(args[1])):
+		return args[2]
+	return args[1]
+
+# builds a handler for the many "X of Y" templates - the definition becomes prefix + Y, and tags are added
+def formOf(prefix, *formTags):
+	def handler(labs, tags, defi):
+		tags.extend(formTags)
+		target = templateTarget(labs)
+		return defi if target is None else prefix + target
+	return handler
+
+def nonGloss(labs, tags, defi):
+	tags.append('non-gloss')
+	return labs[1] + ' ' + defi
+
+def taxLink(labs, tags, defi):
+	tags.append(labs[2])
+	return 'Of the ' + labs[2] + ' ' + labs[1]
+
+def surname(labs, tags, defi):
+	tags.append('surname')
+	return 'surname'
+
+def givenName(labs, tags, defi):
+	noor = True
+	for lb in labs[2:]:
+		if(lb.startswith('or=')):
+			defi = 'Given name (male or female)'
+			tags.append('male')
+			tags.append('female')
+			noor = False
+	if(noor):
+		gender = templateTarget(labs)
+		defi = 'Given name (' + gender + ')'
+		tags.append(gender)
+	tags.append('given name')
+	return defi
+
+def historicalGivenName(labs, tags, defi):
+	tags.append('given name')
+	tags.append('historical')
+	return 'Historic given name, used by ' + labs[2]
+
+def senseId(labs, tags, defi):
+	# TODO deal with this
+	# senseid requires poselabel 'qualifier'
+	# senseid sometimes refers to Wikidata Q#### code, sometimes to word(s)
+	# return prelabels[2] + postlabels
+	return defi
+
+# handlers for templates found at the start of a definition, by template name. A handler gets
+# (template args with formatting removed, list of tags to add to, definition so far) and returns the new definition.
+# Definitions starting with any other template are kept as they are.
+defTemplates = {
+	'alternative form of': formOf('Alternate form of ', 'alt form'),
+	'eye dialect of': formOf('Eye dialiect of ', 'dialect'),
+	'alternative spelling of': formOf('Alternate spelling of ', 'alt spelling'),
+	'misspelling of': formOf('Misspelling of ', 'misspelling'),
+	'initialism of': formOf('Initialism of ', 'initialism'),
+	'plural of': formOf('Plural of ', 'plural'),
+	'present participle of': formOf('Present participle of ', 'present participle'),
+	'en-comparative of': formOf('Comparative of ', 'comparative'),
+	'abbreviation of': formOf('Abbreviation of ', 'abbreviation'),
+	'en-third-person singular of': formOf('Third-person singular of ', 'third-person', 'singular'),
+	'archaic spelling of': formOf('Archaic spelling of ', 'archaic', 'alt spelling'),
+	'non-gloss definition': nonGloss,
+	'n-g': nonGloss,
+	'obsolete form of': formOf('Obselete form of ', 'obselete', 'alt form'),
+	'taxlink': taxLink,
+	'surname': surname,
+	'given name': givenName,
+	'historical given name': historicalGivenName,
+	# TODO handle inflections properly
+	# ['first','second','third'][d[3]] + '-person ' + {'s':'singular'}[d[4]] + ' ' +
+	# {'indc':'indicative', 'subj':'subjunctive', 'impr':'imperative'}[d[6]]
+	'inflection of': formOf('Inflection of ', 'inflection'),
+	'senseid': senseId,
+	'rfv-sense': senseId,
+	'en-past of': formOf('Past form of ', 'past'),
+	'en-simple past of': formOf('Past form of ', 'past'),
+}
+# adds (or replaces) the handler for a definition template - see defTemplates
+def addDefTemplate(name, handler):
+	defTemplates[name] = handler
+
+# matches the start of a definition line, along with its {{lb|en|...}} labels if nothing's nested in them and
+# something comes after them - groups the labels
+definitionStartPT = re.compile(r'#+ (?:\{\{lbl?\|[a-z]{2,3}\|([^{}\[\]]+)\}\}(?=.) ?)?')
+
+# finds the parts of a definition line (# {{lb|en|labels}} definition) - returns (tuple of labels or None,
+# where the definition starts), or None if the line isn't a definition. line is a WikiLine.
+@profiled
+def definitionParts(line):
+	text = line.text
+	match = definitionStartPT.match(text)
+	if(match is None):
+		return None
+	if(match[1]):
+		return (tuple(match[1].split('|')), match.end())
+	start = match.end()
+	# labels with something nested in them
+	if(text.startswith('{{lb', start)):
+		template = line.templateAt(start)
+		if(template):
+			end, args = template[1], template[2]
+			if(end < len(text) and len(args) > 2 and (args[0] == 'lb' or args[0] == 'lbl') and langCodePT.fullmatch(args[1])
+				and (len(args) > 3 or args[2])):
+				return (tuple(args[2:]), end + 1 if text.startswith(' ', end) else end)
+	return (None, start)
+
+# the kind of form a definition template names, if it's one of the "X of Y" templates - plural of -> plural,
+# en-simple past of -> simple past - or None if it isn't one
+def formOfKind(name):
+	if(not name.endswith(' of')):
+		return None
+	return name[3:-3] if name.startswith('en-') else name[:-3]
+
+# the word a definition is a form of, as (kind, word), if it starts with an "X of Y" template ({{plural of|en|mouse}}) -
+# or None. d is a WikiLine, and start is where the definition starts in it, as for cleanDef.
+@profiled
+def formOfLink(d, start):
+	# most definitions aren't forms of anything - skip them without looking at their templates
+	if(not d.text.startswith('{{', start) or ' of|' not in d.text):
+		return None
+	template = d.templateAt(start)
+	if(template is None):
+		return None
+	args = template[2]
+	kind = formOfKind(args[0])
+	if(kind is None or len(args) < 2):
+		return None
+	# {{plural of|en|mouse}}, or the older {{plural of|mouse|lang=en}}
+	target = removeFormatting(templateTarget(args)).strip()
+	return (kind, target) if target else None
+
+# the arguments of the headword template a WikiLine starts with ({{en-noun|s|es}}) if its name matches namePT, or None
+def headwordArgs(line, namePT):
+	if(not line.text.startswith('{{') or not namePT.match(line.text, 2)):
+		return None
+	template = line.templateAt(0)
+	return template[2] if template else None
+
+# the arguments of the plural rule template a WikiLine starts with ({{en-noun|s|es}}), or None if it doesn't start with one
+@profiled
+def pluralArgs(line):
+	return headwordArgs(line, pluralTemplatePT)
+
+# the keys inflected forms are saved under in a section - plurals in nouns, the rest in verbs and adjectives
+formKinds = ('plural', 'thirdPerson', 'presentParticiple', 'past', 'pastParticiple', 'comparative', 'superlative')
+
+# regular English inflections, with the usual spelling changes - walks, pushes, tries / baking, dying, seeing / baked, tried
+def englishS(word):
+	if(word.endswith(('s', 'x', 'z', 'ch', 'sh'))):
+		return word + 'es'
+	if(len(word) > 1 and word[-1] == 'y' and word[-2] not in 'aeiou'):
+		return word[:-1] + 'ies'
+	return word + 's'
+
+def englishIng(word):
+	if(word.endswith('ie')):
+		return word[:-2] + 'ying'
+	if(len(word) > 2 and word[-1] == 'e' and word[-2] not in 'eoy'):
+		return word[:-1] + 'ing'
+	return word + 'ing'
+
+def englishEd(word):
+	if(word.endswith('e')):
+		return word + 'd'
+	if(len(word) > 1 and word[-1] == 'y' and word[-2] not in 'aeiou'):
+		return word[:-1] + 'ied'
+	return word + 'ed'
+
+# comparative and superlative - bigger is irregular enough as far as this is concerned, and needs giving in full
+def englishEr(word):
+	if(word.endswith('e')):
+		return (word + 'r', word + 'st')
+	if(len(word) > 1 and word[-1] == 'y' and word[-2] not in 'aeiou'):
+		return (word[:-1] + 'ier', word[:-1] + 'iest')
+	return (word + 'er', word + 'est')
+
+# the endings of the old style {{en-verb|stem|ending}} - what to add to the stem for (third person, participle, past),
+# where no third person means the regular one
+verbStemEndings = {'es': ('es', 'ing', 'ed'), 'ies': ('ies', 'ying', 'ied'), 'ing': (None, 'ing', 'ed')}
+
+# converts the arguments of an {{en-verb}} (without the template's name) to the verb's forms - returns
+# {kind: [forms]} for the kinds in formKinds. Arguments give the third person, present participle, past and
+# past participle in that order, with empty ones and + for the regular form and ++ to double the last letter
+# (stopped). The older shorthands - es, ies, d, stem|ending and stem|letter|ed - work too.
+@profiled
+def verbForms(word, args):
+	args = [arg for arg in args if '=' not in arg]
+	third = englishS(word)
+	participle = englishIng(word)
+	past = englishEd(word)
+	pastParticiple = None
+	if(args == ['es']):
+		third = word + 'es'
+	elif(args == ['ies']):
+		third = word[:-1] + 'ies'
+		participle = word + 'ing'
+		past = word[:-1] + 'ied'
+	elif(args == ['d']):
+		third = word + 's'
+		participle = englishIng(word)
+		past = word + 'd'
+	elif(len(args) == 2 and args[1] in verbStemEndings):
+		stem = args[0]
+		add = verbStemEndings[args[1]]
+		if(add[0]):
+			third = stem + add[0]
+		participle = stem + add[1]
+		past = stem + add[2]
+	elif(len(args) == 3 and len(args[1]) == 1 and args[2] == 'ed'):
+		# a doubled last letter - {{en-verb|stop|p|ed}}
+		third = word + 's'
+		participle = args[0] + args[1] + 'ing'
+		past = args[0] + args[1] + 'ed'
+	elif(args == ['++']):
+		participle = word + word[-1:] + 'ing'
+		past = word + word[-1:] + 'ed'
+	else:
+		forms = [third, participle, past, None]
+		for i in range(min(len(args), 4)):
+			if(args[i] and args[i] != '+'):
+				forms[i] = args[i]
+		third, participle, past, pastParticiple = forms
+	forms = {'thirdPerson': [third], 'presentParticiple': [participle], 'past': [past], 'pastParticiple': [pastParticiple or past]}
+	return {kind: [removeFormatting(form) for form in forms[kind]] for kind in forms}
+
+# converts the arguments of an {{en-adj}} (without the template's name) to the adjective's comparatives and superlatives -
+# returns {kind: [forms]}, with nothing for adjectives that aren't comparable. er is for -er/-est, more for more/most
+# and - for not being comparable. Anything else is a comparative, followed by its superlative if it isn't -er.
+# Superlatives given as sup=, sup2=... replace the rest.
+@profiled
+def adjectiveForms(word, args):
+	givenSuperlatives = []
+	for arg in args:
+		name, equals, value = arg.partition('=')
+		if(equals and value and name.rstrip('0123456789') == 'sup'):
+			givenSuperlatives.append(removeFormatting(value))
+	args = [arg for arg in args if '=' not in arg]
+	if(not args):
+		args = ['more']
+	comparatives = []
+	superlatives = []
+	i = 0
+	while(i < len(args)):
+		arg = args[i]
+		i += 1
+		if(arg == 'er'):
+			comparative, superlative = englishEr(word)
+		elif(arg == 'more'):
+			comparative, superlative = ('more ' + word, 'most ' + word)
+		elif(not arg or arg in ('-', '?', '+')):
+			continue
+		else:
+			comparative = arg
+			superlative = None
+			if(i < len(args) and args[i] not in ('er', 'more', '-', '?', '+')):
+				superlative = args[i]
+				i += 1
+			elif(arg.endswith('er')):
+				superlative = arg[:-2] + 'est'
+		comparatives.append(removeFormatting(comparative))
+		if(superlative):
+			superlatives.append(removeFormatting(superlative))
+	if(givenSuperlatives):
+		superlatives = givenSuperlatives
+	forms = {}
+	if(comparatives):
+		forms['comparative'] = comparatives
+	if(superlatives):
+		forms['superlative'] = superlatives
+	return forms
+
+# formats a definition properly - returns (formatted def, tags to add). d is a WikiLine, and start is where the definition
+# starts in it. A template at the start (prelabels) can change the definition, and one after it (postlabels) can add to it.
+# hits is a Counter of definitions starting with each template, handled or not, when they're being counted.
+@profiled
+def cleanDef(d, start=0, hits=None):
+	text = d.text
+	# without any templates, it's all definition
+	if(text.find('{', start) < 0):
+		return (removeFormatting(text[start:]), [])
+	defStart = start
+	prelabels = None
+	template = d.templateAt(start)
+	if(template and template[2] != ['']):
+		prelabels = template[2]
+		start = template[1] + 1 if text.startswith(' ', template[1]) else template[1]
+	# the definition runs up to the next template
+	template = d.nextTemplate(start)
+	defi = removeFormatting(text[start:template[0]] if template else text[start:])
+	postlabels = template[2] if template else None
 	tags = []
 	# deal with prelabel-specific definitions
 	if(prelabels):
-		prelabels = prelabels.split('|')
 		# remove formatting on prelabels
 		numPreLabels = len(prelabels)
 		for i in range(1,numPreLabels):
@@ -162,110 +838,1762 @@ def cleanDef(d):
 
 		# first label - defines label type
 		f = prelabels[0]
-		if(f == 'alternative form of'):
-			defi = 'Alternate form of ' + prelabels[1]
-			tags.append('alt form')
-		if(f == 'eye dialect of'):
-			defi = 'Eye dialiect of ' + prelabels[1]
-			tags.append('dialect')
-		elif(f == 'alternative spelling of'):
-			defi = 'Alternate spelling of ' + prelabels[1]
-			tags.append('alt spelling')
-		elif(f == 'misspelling of'):
-			defi = 'Misspelling of ' + prelabels[1]
-			tags.append('misspelling')
-		elif(f == 'initialism of'):
-			defi = 'Initialism of ' + prelabels[1]
-			tags.append('initialism')
-		elif(f == 'plural of'):
-			defi = 'Plural of ' + prelabels[1]
-			tags.append('plural')
-		elif(f == 'present participle of'):
-			defi = 'Present participle of ' + prelabels[1]
-			tags.append('present participle')
-		elif(f == 'en-comparative of'):
-		 	defi = 'Comparative of ' + prelabels[1]
-			tags.append('comparative')
-		elif(f == 'abbreviation of'):
-			defi = 'Abbreviation of ' + prelabels[1]
-			tags.append('abbreviation')
-		elif(f == 'en-third-person singular of'):
-			defi = 'Third-person singular of ' + prelabels[1]
-			tags.append('third-person')
-			tags.append('singular')
-		elif(f == 'archaic spelling of'):
-			defi = 'Archaic spelling of ' + prelabels[1]
-			tags.append('archaic')
-			tags.append('alt spelling')
-		elif(f == 'non-gloss definition' or f == 'n-g'):
-			defi = prelabels[1] + ' ' + defi
-			tags.append('non-gloss')
-		elif(f == 'obsolete form of'):
-			defi = 'Obselete form of ' + prelabels[1]
-			tags.append('obselete')
-			tags.append('alt form')
-		elif(f == 'taxlink'):
-			defi = 'Of the ' + prelabels[2] + ' ' + prelabels[1]
-			tags.append(prelabels[2])
-		elif(f == 'surname'):
-			defi = 'surname'
-			tags.append('surname')
-		elif(f == 'given name'):
-			noor = True
-			for lb in prelabels[2:]:
-				if(lb.startswith('or=')):
-					defi = 'Given name (male or female)'
-					tags.append('male')
-					tags.append('female')
-					noor = False
-					continue
-			if(noor):
-				defi = 'Given name (' + prelabels[1] + ')'
-				tags.append(prelabels[1])
-			tags.append('given name')
-		elif(f == 'historical given name'):
-			defi = 'Historic given name, used by ' + prelabels[2]
-			tags.append('given name')
-			tags.append('historical')
-		elif(f == 'inflection of'):
-			# TODO handle inflections properly
-			'''
-			return ['first','second','third'][d[3]] +
-		 		'-person ' +
-				{'s':'singular'}[d[4]] + ' ' +
-				{'indc':'indicative', 'subj':'subjunctive', 'impr':'imperative'}[d[6]] + ' ' +
-			'''
-			defi = 'Inflection of ' + prelabels[1]
-			tags.append('inflection')
-		elif(f == 'senseid' or 'rfv-sense'):
-			pass
-			# TODO deal with this
-			# senseid requires poselabel 'qualifier'
-			# senseid sometimes refers to Wikidata Q#### code, sometimes to word(s)
-			# return prelabels[2] + postlabels
-		elif(f == 'en-past of' or f == 'en-simple past of'):
-			defi = 'Past form of ' + prelabels[1]
-			tags.append('past')
+		if(hits is not None):
+			hits[f] += 1
+		handler = defTemplates.get(f)
+		if(handler is None):
+			# templates without a handler are rendered like derived terms - links keep their term, the rest are dropped
+			lead = text[defStart:start]
+			defi = removeFormatting(renderWikitext(lead, parseWikitext(lead), derivedTermPart)).lstrip() + defi
 		else:
-			tags.append('UNKNOWN TAG')
-			return (d,[])
-		# if(f == )
+			defi = handler(prelabels, tags, defi)
 
 	if(postlabels):
-		postlabels = postlabels.split('|')
-		# remove formatting on prelabels
-		for i in range(1,len(postlabels)):
-			postlabels[i] = removeFormatting(postlabels[i])
-
 		f = postlabels[0]
 
-		if(f == 'm'):
-			defi += '\'' + postlabels[2] + '\''
+		if(f == 'm' and len(postlabels) > 2):
+			defi += '\'' + removeFormatting(postlabels[2]) + '\''
 
 	return (defi,tags)
 
 #TODO remove inner tags {{m|en|...}} https://en.wiktionary.org/wiki/Template:mention
 
+# label lists seen so far - the same few lists come up on a huge number of definitions, so they're all shared
+labelSets = {}
+
+# a shared, interned copy of a list of labels
+def internLabels(labels):
+	labels = tuple(sys.intern(label) for label in labels)
+	return labelSets.setdefault(labels, labels)
+
+# a definition along with its labels - saved as {"labels":[...],"def":"..."}, or without labels if it has none.
+# Pages hold millions of these, so they're slotted records instead of dicts.
+class Definition():
+	__slots__ = ('labels', 'text')
+
+	def __init__(self, labels, text):
+		self.labels = labels	# tuple of labels, shared through internLabels
+		self.text = text
+
+	def toJSON(self):
+		return {'labels': self.labels, 'def': self.text} if self.labels else {'def': self.text}
+
+# lets json turn the records in pages into JSON - pass as json.dumps' default
+def pageJSON(o):
+	if(isinstance(o, Definition)):
+		return o.toJSON()
+	raise TypeError('Can\'t turn ' + type(o).__name__ + ' into JSON')
+
+# size of the read buffer used on dumps - big reads keep decompression and disk access cheap
+readBufferSize = 1 << 20
+# reads a bz2 file stream by stream, keeping track of where recent streams started in the file.
+# That lets positions in it be given as (offset of a stream, offset within the stream), which can
+# be jumped back to without decompressing everything before them (see openDump and dumpPosition).
+class Bz2Reader(io.RawIOBase):
+	def __init__(self, path, streamOffset=0):
+		self.f = open(path, 'rb')
+		self.f.seek(streamOffset)
+		self.rawPos = streamOffset	# offset in the file of the next compressed byte to read
+		self.d = bz2.BZ2Decompressor()
+		self.data = b''	# decompressed data not handed out yet
+		self.dataPos = 0
+		self.pos = 0	# number of decompressed bytes handed out
+		# (decompressed position, offset in the file) of the most recently started streams
+		self.starts = cl.deque([(0, streamOffset)], 64)
+
+	def readable(self):
+		return True
+
+	def readinto(self, b):
+		while(self.dataPos >= len(self.data)):
+			chunk = b''
+			if(self.d.eof):
+				# another stream starts right where this one ended
+				chunk = self.d.unused_data
+				self.d = bz2.BZ2Decompressor()
+				self.starts.append((self.pos, self.rawPos - len(chunk)))
+			if(not chunk):
+				chunk = self.f.read(readBufferSize)
+				if(not chunk):
+					return 0
+				self.rawPos += len(chunk)
+			self.data = self.d.decompress(chunk)
+			self.dataPos = 0
+
+		n = min(len(b), len(self.data) - self.dataPos)
+		b[:n] = memoryview(self.data)[self.dataPos:self.dataPos + n]
+		self.dataPos += n
+		self.pos += n
+		return n
+
+	def tell(self):
+		return self.pos
+
+	# turns a recent decompressed position into (offset of its stream, offset within the stream)
+	def position(self, pos):
+		for start, offset in reversed(self.starts):
+			if(start <= pos):
+				return (offset, pos - start)
+		raise ValueError('Position is too far behind the reader')
+
+	def close(self):
+		self.f.close()
+		io.RawIOBase.close(self)
+
+# leading bytes of the compressed formats that dumps are distributed in
+bz2Magic = b'BZh'
+otherCompressedMagics = ((b'\x1f\x8b', gzip.open), (b'\xfd7zXZ\x00', lzma.open))
+
+# opens a dump for reading as bytes - compressed dumps (.bz2, .gz, .xz) are decompressed on the fly.
+# position is where to start reading, as given by dumpPosition. Jumping to it is instant for plain XML
+# and quick for bz2 (only the rest of its stream is skipped), but needs everything before it decompressed for .gz/.xz.
+def openDump(path, bufferSize=readBufferSize, position=(0, 0)):
+	streamOffset, offset = position
+	with open(path, 'rb') as f:
+		magic = f.read(6)
+	if(magic.startswith(bz2Magic)):
+		inf = io.BufferedReader(Bz2Reader(path, streamOffset), bufferSize)
+		while(offset > 0):
+			skipped = len(inf.read(min(offset, bufferSize)))
+			if(not skipped):
+				break
+			offset -= skipped
+		return inf
+	for m, opener in otherCompressedMagics:
+		if(magic.startswith(m)):
+			inf = io.BufferedReader(opener(path, 'rb'), bufferSize)
+			break
+	else:
+		inf = open(path, 'rb', bufferSize)
+	if(offset):
+		inf.seek(offset)
+	return inf
+
+# where a dump opened by openDump is up to, or where pos (a decompressed offset) is in it -
+# returns (offset of the bz2 stream, offset within the stream), or (0, offset) for anything but bz2
+def dumpPosition(inf, pos=None):
+	if(pos is None):
+		pos = inf.tell()
+	raw = getattr(inf, 'raw', None)
+	if(isinstance(raw, Bz2Reader)):
+		return raw.position(pos)
+	return (0, pos)
+
+# how far into its file a dump opened by openDump has read - for compressed dumps, this counts compressed bytes
+def dumpFileOffset(inf):
+	raw = inf.raw
+	if(isinstance(raw, Bz2Reader)):
+		return raw.rawPos
+	if(isinstance(raw, gzip.GzipFile)):
+		return raw.fileobj.tell()
+	if(isinstance(raw, lzma.LZMAFile)):
+		return raw._fp.tell()
+	return inf.tell()
+
+# namespace numbers of the pages a run parses by default - the main namespace, where the entries are
+defaultNamespaces = frozenset((0,))
+# wiktionary's namespaces by name, for setNamespaces
+namespaceNumbers = {'Main': 0, 'Talk': 1, 'User': 2, 'Wiktionary': 4, 'File': 6, 'MediaWiki': 8, 'Template': 10,
+	'Help': 12, 'Category': 14, 'Appendix': 100, 'Concordance': 102, 'Index': 104, 'Rhymes': 106, 'Transwiki': 108,
+	'Thesaurus': 110, 'Citations': 114, 'Sign gloss': 116, 'Reconstruction': 118, 'Module': 828}
+
+pageEndTag = b'</page>'
+
+# reads a page's title and namespace out of the <title> and <ns> lines at its start - returns (title, namespace).
+# The title is unescaped. Dumps from before <ns> was added go by the title instead - anything with a prefix isn't in
+# the main namespace.
+def pageHead(titleLine, nsLine):
+	line = titleLine.strip()
+	word = ''
+	if(line.startswith(b'<title>') and line.endswith(b'</title>')):
+		word = line[7:-8].decode('utf-8')
+		if('&' in word):
+			word = html.unescape(word)
+	line = nsLine.strip()
+	if(line.startswith(b'<ns>') and line.endswith(b'</ns>')):
+		return (word, int(line[4:-5]))
+	return (word, None if ':' in word else 0)
+
+# reads the <title> and <ns> lines at the start of a page - returns (title, namespace, ns line).
+# The ns line is handed back so that the line read in its place in an old dump isn't lost.
+def readPageHead(inf):
+	titleLine = inf.readline()
+	nsLine = inf.readline()
+	word, namespace = pageHead(titleLine, nsLine)
+	return (word, namespace, nsLine)
+
+# skipPage goes through this many lines of a page one by one before searching the rest a buffer at a time -
+# looking at the whole read buffer costs more than going through a short page's lines
+skipPageLines = 64
+
+# skips the rest of a page, up to and including its </page> line - long pages are skipped without splitting them
+# into lines. The tag can't be in a page's text, where it would be escaped as &lt;/page&gt;.
+def skipPage(inf):
+	count = 0
+	for line in inf:
+		if(line.strip() == pageEndTag):
+			return
+		count += 1
+		if(count == skipPageLines and hasattr(inf, 'peek')):
+			break
+	else:
+		return
+	tail = b''
+	while(True):
+		buf = inf.peek()
+		if(not buf):
+			return
+		end = None
+		if(tail):
+			# the tag may have been split between the end of the last buffer and the start of this one
+			split = (tail + buf[:len(pageEndTag) - 1]).find(pageEndTag)
+			if(split >= 0):
+				end = split - len(tail) + len(pageEndTag)
+		if(end is None):
+			found = buf.find(pageEndTag)
+			if(found >= 0):
+				end = found + len(pageEndTag)
+		if(end is not None):
+			inf.read(end)
+			inf.readline()
+			return
+		tail = (tail + buf)[1 - len(pageEndTag):]
+		inf.read(len(buf))
+
+# splits a dump into its pages - yields (title, lines) where lines are the raw lines between the page's <title> and </page>.
+# Pages outside namespaces (a set of namespace numbers) are skipped over without being split into lines.
+def readPages(inf, namespaces=defaultNamespaces):
+	for word, namespace, lines in readNamespacedPages(inf, namespaces):
+		yield (word, lines)
+
+# readPages, but yielding (title, namespace number, lines)
+def readNamespacedPages(inf, namespaces=defaultNamespaces):
+	for line in inf:
+		if(line.strip() != b'<page>'):
+			continue
+
+		word, namespace, nsLine = readPageHead(inf)
+		if(namespace not in namespaces):
+			if(nsLine.strip() != pageEndTag):
+				skipPage(inf)
+			continue
+
+		lines = [nsLine]
+		for line in inf:
+			if(line.strip() == pageEndTag):
+				break
+			lines.append(line)
+		yield (word, namespace, lines)
+
+pageIdPT = re.compile(rb'<id>(\d+)</id>')
+sha1PT = re.compile(rb'<sha1>([^<]*)</sha1>')
+
+# finds a page's id and the sha1 of its text in its raw lines - returns (id, sha1), with None for anything missing
+def pageRevision(lines):
+	pageId = None
+	# the page's own <id> is the first one - the revision's and contributor's come after it
+	for line in lines:
+		match = pageIdPT.search(line)
+		if(match):
+			pageId = int(match.group(1))
+			break
+	sha1 = None
+	# the <sha1> is right at the end of the revision
+	for line in reversed(lines):
+		match = sha1PT.search(line)
+		if(match):
+			sha1 = match.group(1).decode('ascii')
+			break
+	return (pageId, sha1)
+
+# reads a manifest written alongside a run's output - yields (page id, sha1, if the page was saved, title) in dump order
+def readManifest(path):
+	with open(path, encoding='utf-8') as f:
+		for line in f:
+			pageId, sha1, kept, title = line.rstrip('\n').split('\t', 3)
+			yield (int(pageId) if pageId else None, sha1, kept == '1', title)
+
+# number of bz2 streams (~100 pages each) handed to a worker at a time when parsing in parallel
+streamsPerTask = 10
+
+# the index wikimedia ships next to a multistream dump, if the usual naming is followed
+def defaultStreamIndex(path):
+	if('multistream.xml' not in path):
+		return None
+	return path.replace('multistream.xml', 'multistream-index.txt')
+
+# the parser a parallel worker process runs its share of the dump through
+workerParser = None
+
+def initStreamWorker(parser):
+	global workerParser
+	workerParser = parser
+
+def parseStreamWorker(bounds):
+	return workerParser.parseStreamRange(*bounds)
+
+# reads the byte offsets of every bz2 stream out of a multistream dump's index (lines of offset:pageid:title)
+def readStreamIndex(path):
+	offsets = []
+	with openDump(path) as f:
+		for line in f:
+			offset = int(line[:line.index(b':')])
+			if(not offsets or offsets[-1] != offset):
+				offsets.append(offset)
+	return offsets
+
+# finds where each page readPages would yield lies in a dump - yields (title, start, end) byte offsets,
+# from the start of the page's <page> line to the end of its </page> line
+def findPages(inf, namespaces=defaultNamespaces):
+	while(True):
+		start = inf.tell()
+		line = inf.readline()
+		if(not line):
+			return
+		if(line.strip() != b'<page>'):
+			continue
+
+		word, namespace, nsLine = readPageHead(inf)
+		if(nsLine.strip() != pageEndTag):
+			skipPage(inf)
+
+		# pages outside namespaces are skipped by readPages, so there's no point in finding them
+		if(namespace in namespaces):
+			yield (word, start, inf.tell())
+
+# title2PT and title3pPT, for finding headers before anything's decoded
+title2BytesPT = re.compile(title2PT.pattern.encode('utf-8'))
+title3pBytesPT = re.compile(title3pPT.pattern.encode('utf-8'))
+# lines of a page's text that could be a header or the ---- between languages once stripped -
+# matches start at the newline before the line, which is quicker to find
+headerLinePT = re.compile(rb'\n([=\- \t\r\f\v][^\n]*)')
+# the tag the first line of a page's text comes after - as in __parsePage, the line is only looked at when the tag is exactly this
+textTag = b'<text xml:space="preserve">'
+pageStartTag = b'<page>'
+# size of the blocks WordScanner reads a dump in
+scanBlockSize = 1 << 20
+
+# yields the lines of a page's text (in buf, between start and end) that could be a header or ----, stripped
+def headerLines(buf, start, end):
+	lineEnd = start - 1
+	tag = buf.find(b'<text', start, end)
+	if(tag >= 0):
+		lineEnd = buf.find(b'\n', tag, end)
+		if(lineEnd < 0):
+			lineEnd = end
+		line = buf[tag:lineEnd].rstrip()
+		if(line.startswith(textTag)):
+			line = line[len(textTag):]
+			if(line.startswith((b'=', b'-'))):
+				yield line
+	for match in headerLinePT.finditer(buf, lineEnd, end):
+		line = match.group(1).strip()
+		if(line.startswith((b'=', b'-'))):
+			yield line
+
+# the reader behind words only runs - finds the pages that have a ==Language== header for one of langs followed by a
+# ===Section=== header for one of sects (either empty for any), the same as parsing them for words only would.
+# The dump is read a block at a time and each page is searched whole for header lines, so nothing but the headers
+# is looked at, and a page is left as soon as it's found to have a target section.
+class WordScanner():
+	def __init__(self, inf, namespaces, langs, sects, revisions=False):
+		self.inf = inf
+		self.namespaces = namespaces
+		self.langs = {lang.encode('utf-8') for lang in langs} if langs else None
+		self.sects = {sect.encode('utf-8') for sect in sects} if sects else None
+		self.revisions = revisions	# if each page's (id, sha1) should be found, as pageRevision would
+		self.end = inf.tell()	# where in the dump the last page yielded ends
+		self.lines = 0	# number of lines in the pages yielded so far
+
+	# yields (title, if the page has a target section, revision or None) for each page in a target namespace
+	def pages(self):
+		inf = self.inf
+		buf = b''
+		base = inf.tell()	# where in the dump buf starts
+		pos = 0
+		while(True):
+			start = buf.find(pageStartTag, pos)
+			end = buf.find(pageEndTag, start) if start >= 0 else -1
+			if(end < 0):
+				# read on until there's a whole page in the buffer
+				block = inf.read(scanBlockSize)
+				if(not block):
+					return
+				keep = start if start >= 0 else max(pos, len(buf) - len(pageStartTag) + 1)
+				base += keep
+				buf = buf[keep:] + block
+				pos = 0
+				continue
+			pos = end + len(pageEndTag)
+			if(buf.startswith(b'\n', pos)):
+				pos += 1
+
+			titleStart = buf.find(b'\n', start) + 1
+			bodyStart = buf.find(b'\n', titleStart) + 1
+			word, namespace = pageHead(buf[titleStart:bodyStart], buf[bodyStart:buf.find(b'\n', bodyStart) + 1])
+			if(namespace not in self.namespaces):
+				continue
+
+			found = False
+			inLang = False
+			langs = self.langs
+			sects = self.sects
+			for line in headerLines(buf, bodyStart, end):
+				if(line == b'----'):
+					inLang = False
+				elif(not inLang):
+					match = title2BytesPT.match(line)
+					inLang = match is not None and (langs is None or match.group(1) in langs)
+				else:
+					match = title3pBytesPT.match(line)
+					if(match and (sects is None or match.group(1) in sects)):
+						found = True
+						break
+
+			revision = None
+			if(self.revisions):
+				match = pageIdPT.search(buf, bodyStart, end)
+				sha1 = buf.rfind(b'<sha1>', bodyStart, end)
+				match2 = sha1PT.match(buf, sha1) if sha1 >= 0 else None
+				revision = (int(match.group(1)) if match else None, match2.group(1).decode('ascii') if match2 else None)
+			self.lines += buf.count(b'\n', bodyStart, end)
+			self.end = base + pos
+			yield (word, found, revision)
+
+# decompresses the bz2 stream starting at offset in f, stopping once at least size bytes are out
+def readStream(f, offset, size):
+	f.seek(offset)
+	d = bz2.BZ2Decompressor()
+	out = []
+	got = 0
+	while(got < size and not d.eof):
+		chunk = f.read(1 << 16)
+		if(not chunk):
+			break
+		data = d.decompress(chunk)
+		out.append(data)
+		got += len(data)
+	return b''.join(out)
+
+# layout of a sorted table file: a header, an offset into the key data for each key (plus one for the end),
+# the keys (sorted bytes, back to back), then a fixed-size value for each key.
+# info is a number the file's writer can use to say what the values refer to.
+sortedTableHeader = struct.Struct('=8sQQ')	# magic, number of keys, info
+
+# writes a sorted table of keys (bytes) and values (tuples matching valueFormat).
+# The contents of the file at payloadPath (if given) go on the end, for the values to point into.
+def writeSortedTable(path, magic, info, keys, valueFormat, values, payloadPath=None):
+	valueStruct = struct.Struct(valueFormat)
+	order = sorted(range(len(keys)), key=keys.__getitem__)
+	offsets = array.array('Q', [0])
+	for i in order:
+		offsets.append(offsets[-1] + len(keys[i]))
+	with open(path, 'wb', writeBufferSize) as f:
+		f.write(sortedTableHeader.pack(magic, len(keys), info))
+		f.write(offsets.tobytes())
+		for i in order:
+			f.write(keys[i])
+		# keep the values 8-byte aligned
+		f.write(b'\0' * (-f.tell() % 8))
+		for i in order:
+			f.write(valueStruct.pack(*values[i]))
+		if(payloadPath):
+			with open(payloadPath, 'rb') as payload:
+				shutil.copyfileobj(payload, f, writeBufferSize)
+
+# read side of writeSortedTable - memory maps the file, so opening it is instant however big it is,
+# and finds keys by binary search without loading anything else
+class SortedTable():
+	def __init__(self, path, magic, valueFormat):
+		self.f = open(path, 'rb')
+		self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+		fileMagic, self.count, self.info = sortedTableHeader.unpack_from(self.mm, 0)
+		if(fileMagic != magic):
+			self.close()
+			raise ValueError(path + ' is not a ' + magic.decode('ascii') + ' file')
+		self.valueStruct = struct.Struct(valueFormat)
+		start = sortedTableHeader.size
+		self.keysStart = start + 8 * (self.count + 1)
+		self.offsets = memoryview(self.mm)[start:self.keysStart].cast('Q')
+		end = self.keysStart + self.offsets[self.count]
+		self.valuesStart = end + (-end % 8)
+		self.payloadStart = self.valuesStart + self.count * self.valueStruct.size
+
+	def __len__(self):
+		return self.count
+
+	def key(self, i):
+		return self.mm[self.keysStart + self.offsets[i]:self.keysStart + self.offsets[i + 1]]
+
+	def value(self, i):
+		return self.valueStruct.unpack_from(self.mm, self.valuesStart + i * self.valueStruct.size)
+
+	# index of the first key >= key
+	def bisect(self, key):
+		lo = 0
+		hi = self.count
+		while(lo < hi):
+			mid = (lo + hi) // 2
+			if(self.key(mid) < key):
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+	# index of key, or -1 if it isn't in the table
+	def find(self, key):
+		i = self.bisect(key)
+		if(i < self.count and self.key(i) == key):
+			return i
+		return -1
+
+	def close(self):
+		if(getattr(self, 'offsets', None) is not None):
+			self.offsets.release()
+			self.offsets = None
+		self.mm.close()
+		self.f.close()
+
+# layout of a hash table file: a header, a slot for each of a power of two of slots, holding one more than the index of
+# the key that hashed to it (0 for none), then the keys and values laid out as in a sorted table - but in the order
+# they were given in rather than sorted. Keys are found by their crc32, so lookups take the same time however many there are.
+hashTableHeader = struct.Struct('=8sQQQ')	# magic, number of keys, number of slots, info
+
+# writes a hash table of keys (distinct bytes) and values (tuples matching valueFormat), followed by payload (bytes)
+def writeHashTable(path, magic, info, keys, valueFormat, values, payload=b''):
+	valueStruct = struct.Struct(valueFormat)
+	# at most half full, so that runs of taken slots stay short
+	slotCount = 8
+	while(slotCount < 2 * len(keys)):
+		slotCount *= 2
+	mask = slotCount - 1
+	slots = array.array('I', bytes(4 * slotCount))
+	offsets = array.array('Q', [0])
+	for i in range(len(keys)):
+		key = keys[i]
+		slot = zlib.crc32(key) & mask
+		while(slots[slot]):
+			slot = (slot + 1) & mask
+		slots[slot] = i + 1
+		offsets.append(offsets[-1] + len(key))
+	with open(path, 'wb', writeBufferSize) as f:
+		f.write(hashTableHeader.pack(magic, len(keys), slotCount, info))
+		f.write(slots.tobytes())
+		f.write(b'\0' * (-f.tell() % 8))
+		f.write(offsets.tobytes())
+		for key in keys:
+			f.write(key)
+		f.write(b'\0' * (-f.tell() % 8))
+		for value in values:
+			f.write(valueStruct.pack(*value))
+		f.write(payload)
+
+# read side of writeHashTable - memory mapped like SortedTable
+class HashTable():
+	def __init__(self, path, magic, valueFormat):
+		self.f = open(path, 'rb')
+		self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+		fileMagic, self.count, slotCount, self.info = hashTableHeader.unpack_from(self.mm, 0)
+		if(fileMagic != magic):
+			self.close()
+			raise ValueError(path + ' is not a ' + magic.decode('ascii') + ' file')
+		self.valueStruct = struct.Struct(valueFormat)
+		self.mask = slotCount - 1
+		start = hashTableHeader.size
+		end = start + 4 * slotCount
+		self.slots = memoryview(self.mm)[start:end].cast('I')
+		start = end + (-end % 8)
+		self.keysStart = start + 8 * (self.count + 1)
+		self.offsets = memoryview(self.mm)[start:self.keysStart].cast('Q')
+		end = self.keysStart + self.offsets[self.count]
+		self.valuesStart = end + (-end % 8)
+		self.payloadStart = self.valuesStart + self.count * self.valueStruct.size
+
+	def __len__(self):
+		return self.count
+
+	def key(self, i):
+		return self.mm[self.keysStart + self.offsets[i]:self.keysStart + self.offsets[i + 1]]
+
+	def value(self, i):
+		return self.valueStruct.unpack_from(self.mm, self.valuesStart + i * self.valueStruct.size)
+
+	# index of key, or -1 if it isn't in the table
+	def find(self, key):
+		slot = zlib.crc32(key) & self.mask
+		while(True):
+			i = self.slots[slot] - 1
+			if(i < 0):
+				return -1
+			if(self.key(i) == key):
+				return i
+			slot = (slot + 1) & self.mask
+
+	def close(self):
+		for name in ('slots', 'offsets'):
+			if(getattr(self, name, None) is not None):
+				getattr(self, name).release()
+				setattr(self, name, None)
+		self.mm.close()
+		self.f.close()
+
+# page index files - each title maps to (stream offset, offset, length) of its page.
+# In a plain XML dump the stream offset is unused and the offset is from the start of the file;
+# in a bz2 dump it's the offset of the page's bz2 stream, and the offset is within the decompressed stream.
+pageIndexMagic = b'WKTPIDX1'
+pageIndexFormat = '=QQQ'
+pageIndexPlain = 0
+pageIndexBz2 = 1
+
+# dictionary files - each word maps to (offset, length) of its data as JSON, in a payload area after the table
+dictionaryMagic = b'WKTDICT1'
+dictionaryFormat = '=QQ'
+
+# lemma index files - a hash table of each inflected form to (offset, length) of its lemmas in a payload area after the table.
+# A form's lemmas are kept as UTF-8 text, each one being the lemma's formKinds index and the lemma, with a \0 between them.
+lemmaIndexMagic = b'WKTLEMM1'
+lemmaIndexFormat = '=QQ'
+
+# relation graph files - a sorted table of words, numbered by their place in it, each mapping to where its outgoing and
+# incoming relations start in the edge arrays after the table (a node's relations end where the next node's start).
+# The table's info is the number of relations. The arrays are compressed sparse rows: the words related to, the words
+# related from (both uint32), the kinds of the outgoing relations, the kinds of the incoming ones (both uint16), then the
+# names of the kinds as UTF-8 text with a \0 between them.
+relationGraphMagic = b'WKTRELG1'
+relationGraphFormat = '=QQ'
+
+# the prefilter only checks for section headers when there are at most this many target sections
+prefilterMaxSections = 4
+
+# matches any of the given header names with the given = marks on either side, in undecoded text
+def headerPattern(marks, names):
+	names = sorted((re.escape(name.encode('utf-8')) for name in names), key=len, reverse=True)
+	return re.compile(marks + b'(?:' + b'|'.join(names) + b')' + marks)
+
+# size of the write buffer used on output files
+writeBufferSize = 1 << 20
+
+# writes pages out as a single JSON object, one page at a time -
+# the result is the same as json.dumps on a dict of every page
+class JSONWriter():
+	# started is whether pages have already been written to outf (when resuming)
+	def __init__(self, outf, started=False):
+		self.outf = outf
+		self.size = 0	# number of characters written
+		self.sep = ',' if started else '{'
+
+	def write(self, word, page):
+		self.writeRaw(word, json.dumps(page, separators=(',', ':'), default=pageJSON))
+
+	# writes a page whose data has already been turned into JSON
+	def writeRaw(self, word, data):
+		s = self.sep + json.dumps(word) + ':' + data
+		self.outf.write(s)
+		self.size += len(s)
+		self.sep = ','
+
+	def close(self):
+		s = '{}' if self.sep == '{' else '}'
+		self.outf.write(s)
+		self.size += len(s)
+
+# writes pages out as newline-delimited JSON - one {"word":{...}} object per line
+class NDJSONWriter():
+	def __init__(self, outf, started=False):
+		self.outf = outf
+		self.size = 0
+
+	def write(self, word, page):
+		self.writeRaw(word, json.dumps(page, separators=(',', ':'), default=pageJSON))
+
+	def writeRaw(self, word, data):
+		s = '{' + json.dumps(word) + ':' + data + '}\n'
+		self.outf.write(s)
+		self.size += len(s)
+
+	def close(self):
+		pass
+
+# writes a plain list of words, one per line
+class WordListWriter():
+	def __init__(self, outf, started=False):
+		self.outf = outf
+		self.size = 0
+		self.sep = '\n' if started else ''
+
+	def write(self, word, page):
+		s = self.sep + word
+		self.outf.write(s)
+		self.size += len(s)
+		self.sep = '\n'
+
+	def writeRaw(self, word, data):
+		self.write(word, None)
+
+	def close(self):
+		pass
+
+# output formats that can be picked with setOutputFormat
+outputFormats = {'json': JSONWriter, 'ndjson': NDJSONWriter}
+
+# the parts of a page - yields (language, section, content). lang/sect are the parser's only
+# target language/section when it has just one, which pages then leave out.
+def pageSections(page, lang, sect):
+	for pageLang, sections in (page.items() if lang is None else ((lang, page),)):
+		for section, content in (sections.items() if sect is None else ((sect, sections),)):
+			yield (pageLang, section, content)
+
+# number of characters each shard holds before writing them out. Shards are only open while they're
+# being written to, so a run can have any number of them without running out of file handles.
+shardBufferSize = 1 << 16
+
+# the path of a shard - the key goes in place of {} in the output path, or before its extension if it has no {}
+def shardPath(path, key):
+	if('{}' in path):
+		return path.replace('{}', key)
+	root, ext = os.path.splitext(path)
+	return root + '.' + key + ext
+
+# ways pages can be split up with setShardBy - each gives the shard a part of a page
+# (a language's section) goes in, and which of the language and section it fixes
+shardKeys = {
+	'language': (lambda lang, section: lang, True, False),
+	'section': (lambda lang, section: section, False, True),
+	'language-section': (lambda lang, section: lang + '-' + section, True, True),
+}
+
+# one shard's output - a writer over a buffer that's appended to the shard's file whenever it fills up
+class Shard():
+	def __init__(self, path, writerType):
+		self.path = path
+		self.buf = io.StringIO()
+		self.writer = writerType(self.buf)
+		open(path, 'w').close()
+
+	def write(self, word, page):
+		self.writer.write(word, page)
+		if(self.buf.tell() >= shardBufferSize):
+			self.flush()
+
+	def flush(self):
+		with open(self.path, 'a', encoding='utf-8') as f:
+			f.write(self.buf.getvalue())
+		self.buf.seek(0)
+		self.buf.truncate()
+
+	def close(self):
+		self.writer.close()
+		self.flush()
+
+# writes pages split up across shards, one output per key, in a single pass. keyFn(lang, section) gives the key of the shard
+# a language's section goes in (None to leave it out). A shard holds the same thing a run targeting just its key would make -
+# the language/section level is left out of its pages where the key fixes it (fixesLang/fixesSect), or the parser only has one.
+# lang/sect are the parser's only target language/section when it has just one, which pages then leave out.
+class ShardWriter():
+	def __init__(self, path, writerType, keyFn, fixesLang, fixesSect, lang, sect):
+		self.path = path
+		self.writerType = writerType
+		self.keyFn = keyFn
+		self.lang = lang
+		self.sect = sect
+		self.keepLang = lang is None and not fixesLang
+		self.keepSect = sect is None and not fixesSect
+		self.shards = {}
+
+	@property
+	def size(self):
+		return sum(shard.writer.size for shard in self.shards.values())
+
+	def write(self, word, page):
+		keepLang = self.keepLang
+		keepSect = self.keepSect
+		entries = {}
+		for lang, section, content in pageSections(page, self.lang, self.sect):
+			key = self.keyFn(lang, section)
+			if(key is None):
+				continue
+			if(not keepLang and not keepSect):
+				entries[key] = content
+				continue
+			entry = entries.get(key)
+			if(entry is None):
+				entry = entries[key] = {}
+			if(keepLang and keepSect):
+				entry = entry.setdefault(lang, {})
+			entry[section if keepSect else lang] = content
+
+		for key, entry in entries.items():
+			shard = self.shards.get(key)
+			if(shard is None):
+				shard = self.shards[key] = Shard(shardPath(self.path, key), self.writerType)
+			shard.write(word, entry)
+
+	def writeRaw(self, word, data):
+		self.write(word, json.loads(data))
+
+	def close(self):
+		for shard in self.shards.values():
+			shard.close()
+
+# writes pages into a dictionary file, for Dictionary to read. Each page's JSON goes into a payload file as it comes,
+# so only the words and where their data is are held in memory - the sorted table is written in front of it at the end.
+# Pages go in just as they are in the JSON output, with the language/section level left out when there's only one.
+class DictionaryWriter():
+	def __init__(self, path):
+		self.path = path
+		self.payloadPath = path + '.payload'
+		self.payload = open(self.payloadPath, 'wb', writeBufferSize)
+		self.words = []
+		self.spans = []
+		self.size = 0	# bytes of data written
+
+	def write(self, word, page):
+		self.writeRaw(word, json.dumps(page, separators=(',', ':'), default=pageJSON))
+
+	def writeRaw(self, word, data):
+		data = data.encode('utf-8')
+		self.words.append(word.encode('utf-8'))
+		self.spans.append((self.size, len(data)))
+		self.payload.write(data)
+		self.size += len(data)
+
+	def close(self):
+		self.payload.close()
+		try:
+			writeSortedTable(self.path, dictionaryMagic, 0, self.words, dictionaryFormat, self.spans, self.payloadPath)
+		finally:
+			os.remove(self.payloadPath)
+
+# reads a dictionary file written with setOutputFormat('dictionary'). The file is memory mapped, so opening it takes
+# no time however big it is, processes reading the same file share its memory, and only the words looked at are decoded.
+class Dictionary():
+	def __init__(self, path):
+		self.table = SortedTable(path, dictionaryMagic, dictionaryFormat)
+
+	def __len__(self):
+		return self.table.count
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def contains(self, word):
+		return self.table.find(word.encode('utf-8')) >= 0
+
+	__contains__ = contains
+
+	def __data(self, i):
+		offset, length = self.table.value(i)
+		start = self.table.payloadStart + offset
+		return json.loads(self.table.mm[start:start + length])
+
+	# the word's data, the same as it would be in parse()'s JSON output - None if the word isn't there
+	def lookup(self, word):
+		i = self.table.find(word.encode('utf-8'))
+		return self.__data(i) if i >= 0 else None
+
+	# yields (word, data) in sorted order for every word from start up to (not including) end - None for no limit
+	def range(self, start=None, end=None):
+		table = self.table
+		i = table.bisect(start.encode('utf-8')) if start is not None else 0
+		stop = table.bisect(end.encode('utf-8')) if end is not None else table.count
+		for i in range(i, stop):
+			yield (table.key(i).decode('utf-8'), self.__data(i))
+
+	# yields (word, data) in sorted order for every word starting with prefix
+	def prefixed(self, prefix):
+		table = self.table
+		prefix = prefix.encode('utf-8')
+		i = table.bisect(prefix)
+		while(i < table.count):
+			key = table.key(i)
+			if(not key.startswith(prefix)):
+				break
+			yield (key.decode('utf-8'), self.__data(i))
+			i += 1
+
+	# yields every word in sorted order, without touching their data
+	def words(self):
+		table = self.table
+		for i in range(table.count):
+			yield table.key(i).decode('utf-8')
+
+	def close(self):
+		self.table.close()
+
+# collects the inflected forms (see formKinds) of the pages written by a run, and writes them out as a lemma index file once
+# the run's done. Forms of more than one word (more big) are left out. lang/sect are as in pageSections.
+class LemmaIndexWriter():
+	def __init__(self, path, lang, sect):
+		self.path = path
+		self.lang = lang
+		self.sect = sect
+		self.forms = {}	# form -> [(formKinds index, lemma)...]
+
+	def add(self, word, page):
+		forms = self.forms
+		for lang, section, content in pageSections(page, self.lang, self.sect):
+			if(isinstance(content, list)):
+				continue
+			for kind in range(len(formKinds)):
+				for form in content.get(formKinds[kind], ()):
+					if(' ' in form):
+						continue
+					lemmas = forms.get(form)
+					if(lemmas is None):
+						forms[form] = [(kind, word)]
+					elif((kind, word) not in lemmas):
+						lemmas.append((kind, word))
+
+	def addRaw(self, word, data):
+		self.add(word, json.loads(data) if data else {})
+
+	def close(self):
+		keys = []
+		spans = []
+		payload = []
+		size = 0
+		for form, lemmas in self.forms.items():
+			data = '\0'.join(str(kind) + lemma for kind, lemma in lemmas).encode('utf-8')
+			keys.append(form.encode('utf-8'))
+			spans.append((size, len(data)))
+			payload.append(data)
+			size += len(data)
+		writeHashTable(self.path, lemmaIndexMagic, 0, keys, lemmaIndexFormat, spans, b''.join(payload))
+		return len(keys)
+
+# reads a lemma index written with setLemmaIndexPath - maps each inflected form to the words it's a form of, without
+# loading the index. Like a dictionary file, it's memory mapped, so opening it is instant and processes share it.
+class LemmaIndex():
+	def __init__(self, path):
+		self.table = HashTable(path, lemmaIndexMagic, lemmaIndexFormat)
+
+	def __len__(self):
+		return self.table.count
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def contains(self, form):
+		return self.table.find(form.encode('utf-8')) >= 0
+
+	__contains__ = contains
+
+	# [(lemma, kind of form)...] for a form - kinds are from formKinds - or None if it isn't a known form of anything
+	def lookup(self, form):
+		table = self.table
+		i = table.find(form.encode('utf-8'))
+		if(i < 0):
+			return None
+		offset, length = table.value(i)
+		start = table.payloadStart + offset
+		entries = table.mm[start:start + length].decode('utf-8').split('\0')
+		return [(entry[1:], formKinds[int(entry[0])]) for entry in entries]
+
+	# the words a form is a form of, in the order they were found - [] if it isn't a known form of anything
+	def lemmas(self, form):
+		entries = self.lookup(form)
+		if(not entries):
+			return []
+		return list(dict.fromkeys(lemma for lemma, kind in entries))
+
+	def close(self):
+		self.table.close()
+
+# the kinds of relations list sections hold - the forms in formOf are relations of the kinds they're listed under
+relationSections = {'Derived terms': 'derived', 'Synonyms': 'synonym'}
+
+# collects the relations between words on the pages written by a run - derived terms, synonyms and the words "X of Y"
+# definitions are forms of - and writes them out as a relation graph file once the run's done. lang/sect are as in pageSections.
+class RelationGraphWriter():
+	def __init__(self, path, lang, sect):
+		self.path = path
+		self.lang = lang
+		self.sect = sect
+		self.ids = {}	# word -> number, in the order they were first seen
+		self.kinds = {}	# kind of relation -> number, in the order they were first seen
+		# the relations, as word and kind numbers
+		self.sources = array.array('I')
+		self.targets = array.array('I')
+		self.edgeKinds = array.array('H')
+
+	def link(self, word, target, kind):
+		if(not target or target == word):
+			return
+		ids = self.ids
+		kinds = self.kinds
+		self.sources.append(ids.setdefault(word, len(ids)))
+		self.targets.append(ids.setdefault(target, len(ids)))
+		self.edgeKinds.append(kinds.setdefault(kind, len(kinds)))
+
+	def add(self, word, page):
+		for lang, section, content in pageSections(page, self.lang, self.sect):
+			if(isinstance(content, list)):
+				kind = relationSections.get(section)
+				if(kind):
+					for term in content:
+						self.link(word, term, kind)
+				continue
+			formsOf = content.get('formOf')
+			if(formsOf):
+				for kind, targets in formsOf.items():
+					for target in targets:
+						self.link(word, target, kind)
+
+	def addRaw(self, word, data):
+		self.add(word, json.loads(data) if data else {})
+
+	# (for each node, where its relations start, relations' other ends, their kinds) in compressed sparse row form.
+	# Each relation is a number made of its node, other end and kind, so that sorting them puts them in order,
+	# and the same relation found twice (in two languages, say) is only kept once.
+	@staticmethod
+	def rows(nodeCount, relations):
+		starts = array.array('Q', bytes(8 * (nodeCount + 1)))
+		ends = array.array('I')
+		kinds = array.array('H')
+		for relation in sorted(relations):
+			starts[(relation >> 48) + 1] += 1
+			ends.append((relation >> 16) & 0xffffffff)
+			kinds.append(relation & 0xffff)
+		for i in range(nodeCount):
+			starts[i + 1] += starts[i]
+		return (starts, ends, kinds)
+
+	def close(self):
+		# words are numbered in sorted order, so the table of them can be searched
+		words = sorted(self.ids)
+		number = array.array('I', bytes(4 * len(words)))
+		for i, word in enumerate(words):
+			number[self.ids[word]] = i
+		sources = [number[i] for i in self.sources]
+		targets = [number[i] for i in self.targets]
+		edgeKinds = self.edgeKinds
+		outStarts, outEnds, outKinds = self.rows(len(words),
+			{source << 48 | target << 16 | kind for source, target, kind in zip(sources, targets, edgeKinds)})
+		inStarts, inEnds, inKinds = self.rows(len(words),
+			{target << 48 | source << 16 | kind for source, target, kind in zip(sources, targets, edgeKinds)})
+		payloadPath = self.path + '.payload'
+		try:
+			with open(payloadPath, 'wb', writeBufferSize) as f:
+				for part in (outEnds, inEnds, outKinds, inKinds):
+					f.write(part.tobytes())
+				f.write(b'\0' * (-f.tell() % 8))
+				f.write('\0'.join(self.kinds).encode('utf-8'))
+			writeSortedTable(self.path, relationGraphMagic, len(outEnds), [word.encode('utf-8') for word in words],
+				relationGraphFormat, list(zip(outStarts, inStarts)), payloadPath)
+		finally:
+			if(os.path.exists(payloadPath)):
+				os.remove(payloadPath)
+		return len(outEnds)
+
+# reads a relation graph written with setRelationGraphPath. Words are nodes, numbered by their place in sorted order, and
+# relations are edges of a kind (derived, synonym, plural, alternative form...) from one word to another. Like a dictionary
+# file, it's memory mapped, so opening it is instant. The edge arrays are kept as memoryviews (outTargets, inSources,
+# outKinds, inKinds) that numpy.frombuffer can use without copying them.
+class RelationGraph():
+	def __init__(self, path):
+		self.table = SortedTable(path, relationGraphMagic, relationGraphFormat)
+		self.edgeCount = edges = self.table.info
+		start = self.table.payloadStart
+		view = memoryview(self.table.mm)
+		self.outTargets = view[start:start + 4 * edges].cast('I')
+		start += 4 * edges
+		self.inSources = view[start:start + 4 * edges].cast('I')
+		start += 4 * edges
+		self.outKinds = view[start:start + 2 * edges].cast('H')
+		start += 2 * edges
+		self.inKinds = view[start:start + 2 * edges].cast('H')
+		start += 2 * edges
+		start += -start % 8
+		self.kinds = self.table.mm[start:].decode('utf-8').split('\0') if edges else []
+		view.release()
+
+	def __len__(self):
+		return self.table.count
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	# a word's node number, or -1 if it isn't in the graph
+	def id(self, word):
+		return self.table.find(word.encode('utf-8'))
+
+	def word(self, node):
+		return self.table.key(node).decode('utf-8')
+
+	def contains(self, word):
+		return self.id(word) >= 0
+
+	__contains__ = contains
+
+	# where a node's outgoing (or incoming) edges are in the edge arrays - (start, end)
+	def span(self, node, incoming=False):
+		table = self.table
+		end = table.value(node + 1)[incoming] if node + 1 < table.count else self.edgeCount
+		return (table.value(node)[incoming], end)
+
+	# (node, kind number) for each edge out of (or into) a node - for walking the graph without decoding words
+	def edges(self, node, incoming=False):
+		start, end = self.span(node, incoming)
+		if(incoming):
+			return list(zip(self.inSources[start:end], self.inKinds[start:end]))
+		return list(zip(self.outTargets[start:end], self.outKinds[start:end]))
+
+	# numbers of the named kinds of relations - None for all of them
+	def kindNumbers(self, kinds):
+		if(kinds is None):
+			return None
+		return {i for i in range(len(self.kinds)) if self.kinds[i] in kinds}
+
+	# [(word, kind)...] for the words a word is related to (or, with incoming, that are related to it) - optionally only
+	# by the given kinds of relations. graph.related('mouse', ('plural',), True) gives [('mice', 'plural')].
+	def related(self, word, kinds=None, incoming=False):
+		node = self.id(word)
+		if(node < 0):
+			return []
+		kinds = self.kindNumbers(kinds)
+		return [(self.word(other), self.kinds[kind]) for other, kind in self.edges(node, incoming)
+			if kinds is None or kind in kinds]
+
+	# yields (word, distance) for every word reachable from a word, nearest first, through relations of the given kinds
+	# (all of them if None), going against them with incoming - up to maxDepth relations away, if given
+	def traverse(self, word, kinds=None, incoming=False, maxDepth=None):
+		node = self.id(word)
+		if(node < 0):
+			return
+		kinds = self.kindNumbers(kinds)
+		seen = {node}
+		level = [node]
+		depth = 0
+		while(level and (maxDepth is None or depth < maxDepth)):
+			depth += 1
+			nextLevel = []
+			for node in level:
+				for other, kind in self.edges(node, incoming):
+					if(other not in seen and (kinds is None or kind in kinds)):
+						seen.add(other)
+						nextLevel.append(other)
+						yield (self.word(other), depth)
+			level = nextLevel
+
+	def close(self):
+		for name in ('outTargets', 'inSources', 'outKinds', 'inKinds'):
+			if(getattr(self, name, None) is not None):
+				getattr(self, name).release()
+				setattr(self, name, None)
+		self.table.close()
+
+# tables of an SQLite output - a word has sections (one per language and section), which have definitions (with labels),
+# plurals, inflections (verbs' and adjectives' other forms), the words they're forms of (form_of) and the terms of list
+# sections (derived terms and synonyms, told apart by their section). definitions_fts is a full-text index
+# over definitions' text, when SQLite has FTS5.
+sqliteSchema = '''
+CREATE TABLE words (id INTEGER PRIMARY KEY, word TEXT NOT NULL);
+CREATE TABLE sections (id INTEGER PRIMARY KEY, word_id INTEGER NOT NULL, language TEXT, section TEXT NOT NULL, countable TEXT);
+CREATE TABLE definitions (id INTEGER PRIMARY KEY, section_id INTEGER NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL);
+CREATE TABLE definition_labels (definition_id INTEGER NOT NULL, position INTEGER NOT NULL, label TEXT NOT NULL);
+CREATE TABLE plurals (section_id INTEGER NOT NULL, plural TEXT NOT NULL);
+CREATE TABLE derived_terms (section_id INTEGER NOT NULL, term TEXT NOT NULL);
+CREATE TABLE inflections (section_id INTEGER NOT NULL, kind TEXT NOT NULL, form TEXT NOT NULL);
+CREATE TABLE form_of (section_id INTEGER NOT NULL, kind TEXT NOT NULL, word TEXT NOT NULL);
+'''
+# built once everything's loaded - that's much quicker than keeping them up to date along the way
+sqliteIndexes = '''
+CREATE INDEX words_word ON words (word);
+CREATE INDEX sections_word ON sections (word_id);
+CREATE INDEX sections_language_section ON sections (language, section);
+CREATE INDEX definitions_section ON definitions (section_id);
+CREATE INDEX definition_labels_definition ON definition_labels (definition_id);
+CREATE INDEX definition_labels_label ON definition_labels (label);
+CREATE INDEX plurals_section ON plurals (section_id);
+CREATE INDEX plurals_plural ON plurals (plural);
+CREATE INDEX derived_terms_section ON derived_terms (section_id);
+CREATE INDEX inflections_section ON inflections (section_id);
+CREATE INDEX inflections_form ON inflections (form);
+CREATE INDEX form_of_section ON form_of (section_id);
+CREATE INDEX form_of_word ON form_of (word);
+'''
+sqliteFTS = '''
+CREATE VIRTUAL TABLE definitions_fts USING fts5 (text, content='definitions', content_rowid='id');
+INSERT INTO definitions_fts (definitions_fts) VALUES ('rebuild');
+'''
+# the forms that go in the inflections table - plurals have a table of their own
+inflectionKinds = formKinds[1:]
+# number of rows held before they're inserted, all in one transaction
+sqliteBatchSize = 50000
+
+# writes pages into an SQLite database, a batch of rows at a time. lang/sect are as in pageSections.
+class SQLiteWriter():
+	def __init__(self, path, lang, sect):
+		self.path = path
+		self.lang = lang
+		self.sect = sect
+		self.size = 0	# number of rows written
+		if(os.path.exists(path)):
+			os.remove(path)
+		# a pipelined run writes from the writer's thread - the connection is only ever used by one thread at a time
+		self.db = sqlite3.connect(path, check_same_thread=False)
+		# the database is built from scratch in one go - if that fails partway, it gets rebuilt rather than recovered
+		self.db.execute('PRAGMA journal_mode = OFF')
+		self.db.execute('PRAGMA synchronous = OFF')
+		self.db.executescript(sqliteSchema)
+		self.wordId = 0
+		self.sectionId = 0
+		self.definitionId = 0
+		self.words = []
+		self.sections = []
+		self.definitions = []
+		self.labels = []
+		self.plurals = []
+		self.derived = []
+		self.inflections = []
+		self.formOf = []
+		self.pending = 0
+
+	def write(self, word, page):
+		self.wordId += 1
+		wordId = self.wordId
+		self.words.append((wordId, word))
+		rows = 1
+		for lang, section, content in pageSections(page, self.lang, self.sect):
+			self.sectionId += 1
+			sectionId = self.sectionId
+			rows += 1
+			if(isinstance(content, list)):
+				self.sections.append((sectionId, wordId, lang, section, None))
+				for term in content:
+					self.derived.append((sectionId, term))
+				rows += len(content)
+				continue
+			self.sections.append((sectionId, wordId, lang, section, content.get('countable')))
+			for i, definition in enumerate(content.get('defs', ())):
+				self.definitionId += 1
+				if(isinstance(definition, Definition)):
+					labels, text = definition.labels, definition.text
+				elif(isinstance(definition, dict)):
+					labels, text = definition.get('labels'), definition['def']
+				else:
+					labels, text = None, definition
+				self.definitions.append((self.definitionId, sectionId, i, text))
+				if(labels):
+					for j, label in enumerate(labels):
+						self.labels.append((self.definitionId, j, label))
+					rows += len(labels)
+				rows += 1
+			for plural in content.get('plural', ()):
+				self.plurals.append((sectionId, plural))
+				rows += 1
+			for kind in inflectionKinds:
+				for form in content.get(kind, ()):
+					self.inflections.append((sectionId, kind, form))
+					rows += 1
+			for kind, targets in content.get('formOf', {}).items():
+				for target in targets:
+					self.formOf.append((sectionId, kind, target))
+				rows += len(targets)
+		self.pending += rows
+		if(self.pending >= sqliteBatchSize):
+			self.flush()
+
+	def writeRaw(self, word, data):
+		self.write(word, json.loads(data) if data else {})
+
+	def flush(self):
+		with self.db:
+			self.db.executemany('INSERT INTO words VALUES (?, ?)', self.words)
+			self.db.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?)', self.sections)
+			self.db.executemany('INSERT INTO definitions VALUES (?, ?, ?, ?)', self.definitions)
+			self.db.executemany('INSERT INTO definition_labels VALUES (?, ?, ?)', self.labels)
+			self.db.executemany('INSERT INTO plurals VALUES (?, ?)', self.plurals)
+			self.db.executemany('INSERT INTO derived_terms VALUES (?, ?)', self.derived)
+			self.db.executemany('INSERT INTO inflections VALUES (?, ?, ?)', self.inflections)
+			self.db.executemany('INSERT INTO form_of VALUES (?, ?, ?)', self.formOf)
+		self.size += self.pending
+		self.pending = 0
+		for rows in (self.words, self.sections, self.definitions, self.labels, self.plurals, self.derived, self.inflections,
+			self.formOf):
+			rows.clear()
+
+	def close(self):
+		self.flush()
+		self.db.executescript(sqliteIndexes)
+		try:
+			self.db.executescript(sqliteFTS)
+		except sqlite3.OperationalError:
+			print('This SQLite doesn\'t have FTS5, so definitions won\'t be searchable.')
+		self.db.execute('ANALYZE')
+		self.db.close()
+
+# output formats that make their own files rather than writing text - each is made with
+# (output path, the parser's only target language or None, its only target section or None)
+databaseFormats = {'sqlite': SQLiteWriter, 'dictionary': lambda path, lang, sect: DictionaryWriter(path)}
+
+# a page carried over from an earlier run's output - text is its data as JSON (None in word lists)
+class PreviousPage():
+	__slots__ = ('text',)
+
+	def __init__(self, text):
+		self.text = text
+
+jsonDecoder = json.JSONDecoder()
+
+# reads back output written by one of the writers - yields (word, its data as JSON text) in the order they were written.
+# fmt is one of outputFormats, or None for a word list (which yields (word, None)).
+def readOutput(path, fmt):
+	with open(path, encoding='utf-8') as f:
+		if(fmt is None):
+			for line in f:
+				line = line.rstrip('\n')
+				if(line):
+					yield (line, None)
+		elif(fmt == 'ndjson'):
+			for line in f:
+				word, end = jsonDecoder.raw_decode(line, 1)
+				yield (word, line[end + 1:line.rindex('}')])
+		else:
+			# one big object - read it a piece at a time, topping the buffer up whenever an entry runs off the end of it
+			buf = f.read(readBufferSize)
+			pos = 1
+			eof = False
+			while(True):
+				try:
+					if(buf[pos] == '}'):
+						return
+					word, keyEnd = jsonDecoder.raw_decode(buf, pos)
+					value, end = jsonDecoder.raw_decode(buf, keyEnd + 1)
+					if(end >= len(buf)):
+						raise IndexError
+				except (ValueError, IndexError):
+					if(eof):
+						raise
+					more = f.read(readBufferSize)
+					eof = not more
+					buf = buf[pos:] + more
+					pos = 0
+					continue
+				yield (word, buf[keyEnd + 1:end])
+				pos = end + 1 if buf[end] == ',' else end
+
+# pages the reader stage of a pipelined run hands over at a time, and writes the parser hands the writer stage at a time -
+# batching keeps the cost of going through a queue down to next to nothing per page
+pipelineBatchSize = 64
+# batches a queue between two stages holds before the stage filling it has to wait
+defaultPipelineQueueSize = 16
+
+# a bounded queue between two stages of a pipelined run. Keeps track of how full it is, and how long the stages
+# on either side of it spent waiting on each other, so it's clear which stage is holding the run up.
+class PipelineQueue():
+	def __init__(self, size):
+		self.queue = queue.Queue(size)
+		self.size = size
+		self.puts = 0
+		self.fillTotal = 0	# number of batches in the queue at each put, added up
+		self.putWait = 0.0	# seconds the stage filling it spent waiting for room
+		self.getWait = 0.0	# seconds the stage emptying it spent waiting for a batch
+
+	def put(self, batch):
+		fill = self.queue.qsize()
+		self.fillTotal += fill
+		self.puts += 1
+		if(fill < self.size):
+			self.queue.put(batch)
+			return
+		start = time.perf_counter()
+		self.queue.put(batch)
+		self.putWait += time.perf_counter() - start
+
+	def get(self):
+		try:
+			return self.queue.get_nowait()
+		except queue.Empty:
+			start = time.perf_counter()
+			batch = self.queue.get()
+			self.getWait += time.perf_counter() - start
+			return batch
+
+	# marks a batch taken with get as dealt with
+	def done(self):
+		self.queue.task_done()
+
+	# waits for every batch put so far to be dealt with
+	def join(self):
+		self.queue.join()
+
+	# (fraction full now, average fraction full, seconds spent waiting for room, seconds spent waiting for a batch)
+	def info(self):
+		return (self.queue.qsize() / self.size, self.fillTotal / self.puts / self.size if self.puts else 0.0, self.putWait, self.getWait)
+
+# the reader stage of a pipelined run - reads and decompresses the dump and splits it into pages in a thread of its own.
+# Batches come out as (pages, dumpPosition after them, bytes read, dumpFileOffset), then None at the end of the dump.
+class PageReader():
+	def __init__(self, inf, namespaces, queueSize):
+		self.inf = inf
+		self.namespaces = namespaces
+		self.queue = PipelineQueue(queueSize)
+		self.readTime = 0.0
+		self.stopping = False
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def run(self):
+		inf = self.inf
+		clock = time.perf_counter
+		try:
+			batch = []
+			start = clock()
+			for page in readPages(inf, self.namespaces):
+				batch.append(page)
+				if(len(batch) == pipelineBatchSize):
+					self.readTime += clock() - start
+					self.queue.put((batch, dumpPosition(inf), inf.tell(), dumpFileOffset(inf)))
+					if(self.stopping):
+						return
+					batch = []
+					start = clock()
+			self.readTime += clock() - start
+			if(batch):
+				self.queue.put((batch, dumpPosition(inf), inf.tell(), dumpFileOffset(inf)))
+			self.queue.put(None)
+		except Exception as e:
+			# the parser finds out when it gets this far
+			self.queue.put(e)
+
+	# yields the batches of pages as they're read
+	def batches(self):
+		while(True):
+			batch = self.queue.get()
+			if(batch is None):
+				return
+			if(isinstance(batch, Exception)):
+				raise batch
+			yield batch
+
+	# stops reading - whatever's been read but not taken is thrown away
+	def stop(self):
+		self.stopping = True
+		while(self.thread.is_alive()):
+			try:
+				self.queue.queue.get_nowait()
+			except queue.Empty:
+				self.thread.join(0.01)
+
+# one parser's share of a run parsed together with others (see WiktionaryParser.parseTogether). Stands in for a parser's
+# PageReader - the dump is read once, and each batch of pages read is sent to every parser's feed, which hands the parser
+# the pages in its namespaces. Batches are as a PageReader's, but with (title, namespace, lines) pages.
+class PageFeed():
+	def __init__(self, namespaces, queueSize):
+		self.namespaces = namespaces
+		self.queue = queue.Queue(queueSize)
+		self.readTime = 0.0	# seconds spent reading the dump, set once it's all been read
+		self.stopping = False	# set once the parser's done with its pages
+
+	# gives the feed a batch (or None at the end of the dump, or an exception), waiting while it's full -
+	# returns False without doing anything if the parser's stopped taking them
+	def send(self, batch):
+		while(not self.stopping):
+			try:
+				self.queue.put(batch, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def batches(self):
+		namespaces = self.namespaces
+		while(True):
+			batch = self.queue.get()
+			if(batch is None):
+				return
+			if(isinstance(batch, Exception)):
+				raise batch
+			pages, position, bytesRead, offset = batch
+			yield ([(word, lines) for word, namespace, lines in pages if namespace in namespaces], position, bytesRead, offset)
+
+	def stop(self):
+		self.stopping = True
+		while(True):
+			try:
+				self.queue.get_nowait()
+			except queue.Empty:
+				return
+
+# the writer stage of a pipelined run - stands in for the writer it wraps, handing the writes to a thread of its own
+# to serialize and write out while the parser gets on with the next pages
+class PipelineWriter():
+	def __init__(self, writer, queueSize):
+		self.writer = writer
+		self.queue = PipelineQueue(queueSize)
+		self.batch = []
+		self.size = 0	# writer's size as of its last batch
+		self.writeTime = 0.0	# seconds the writer spent writing
+		self.error = None	# what went wrong in the writer, if anything
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def run(self):
+		writer = self.writer
+		clock = time.perf_counter
+		while(True):
+			batch = self.queue.get()
+			if(batch is None):
+				return
+			start = clock()
+			# once something's gone wrong, batches are just taken off the queue so the parser doesn't get stuck
+			if(self.error is None):
+				try:
+					for raw, word, page in batch:
+						if(raw):
+							writer.writeRaw(word, page)
+						else:
+							writer.write(word, page)
+					self.size = writer.size
+				except Exception as e:
+					self.error = e
+			self.writeTime += clock() - start
+			self.queue.done()
+
+	def write(self, word, page):
+		self.batch.append((False, word, page))
+		if(len(self.batch) >= pipelineBatchSize):
+			self.send()
+
+	def writeRaw(self, word, data):
+		self.batch.append((True, word, data))
+		if(len(self.batch) >= pipelineBatchSize):
+			self.send()
+
+	def send(self):
+		if(self.error is not None):
+			raise self.error
+		self.queue.put(self.batch)
+		self.batch = []
+
+	# waits for everything written so far to actually be written
+	def wait(self):
+		if(self.batch):
+			self.send()
+		self.queue.join()
+		if(self.error is not None):
+			raise self.error
+
+	def close(self):
+		try:
+			self.wait()
+		finally:
+			self.queue.put(None)
+			self.thread.join()
+		start = time.perf_counter()
+		self.writer.close()
+		self.writeTime += time.perf_counter() - start
+		self.size = self.writer.size
+
+# number of the slowest pages a profile keeps, unless it's told otherwise
+defaultSlowPageCount = 10
+# number of rows of each table in a profile's report
+profileReportRows = 15
+
+# where a profiled run spent its time - calls and seconds for each @profiled function (cumulative - they include the
+# functions they call), for cleanDef by the template a definition starts with, and for each section of pages (from its
+# header up to the next one, whether it's a target section or not), along with the slowest pages parsed. Workers
+# profile their share of a run themselves, and the profiles are added together.
+class RunProfile():
+	def __init__(self, slowPageCount=defaultSlowPageCount):
+		self.functions = {}	# name -> [calls, seconds]
+		self.templates = {}	# name of the template a definition starts with -> [calls, seconds] of cleanDef
+		self.sections = {}	# section -> [headers, seconds]
+		self.slowPageCount = slowPageCount
+		self.slowPages = []	# heap of the slowest (seconds, title)
+		self.section = None	# section of the page being parsed that's being timed
+		self.mark = 0.0	# when it started
+
+	# calls fn with args, adding the call to the profile under name - and cleanDef's under the template the definition
+	# starts with, too
+	def call(self, name, fn, args):
+		counts = self.functions.get(name)
+		if(counts is None):
+			counts = self.functions[name] = [0, 0.0]
+		start = time.perf_counter()
+		try:
+			return fn(*args)
+		finally:
+			took = time.perf_counter() - start
+			counts[0] += 1
+			counts[1] += took
+			if(name == 'cleanDef'):
+				self.addTemplate(args[0].text, args[1] if len(args) > 1 else 0, took)
+
+	# adds a call to cleanDef that took seconds to the template the definition at start in text starts with
+	def addTemplate(self, text, start, seconds):
+		name = '(no template)'
+		if(text.startswith('{{', start)):
+			end = min(i for i in (text.find('|', start), text.find('}', start), len(text)) if i >= 0)
+			name = text[start + 2:end].strip()
+		counts = self.templates.get(name)
+		if(counts is None):
+			self.templates[name] = [1, seconds]
+		else:
+			counts[0] += 1
+			counts[1] += seconds
+
+	# times the page about to be parsed from now (a perf_counter time)
+	def startPage(self, now):
+		self.section = None
+		self.mark = now
+
+	# moves on to a section of the page being parsed - None for anything outside a section
+	def enterSection(self, section):
+		now = time.perf_counter()
+		self.endSection(now)
+		self.section = section
+		self.mark = now
+		if(section is not None):
+			self.sections.setdefault(section, [0, 0.0])[0] += 1
+
+	def endSection(self, now):
+		if(self.section is not None):
+			self.sections[self.section][1] += now - self.mark
+
+	# finishes timing the page parsed - now is when it was done, seconds how long it took altogether
+	def endPage(self, word, now, seconds):
+		self.endSection(now)
+		self.section = None
+		if(len(self.slowPages) < self.slowPageCount):
+			heapq.heappush(self.slowPages, (seconds, word))
+		elif(self.slowPageCount and seconds > self.slowPages[0][0]):
+			heapq.heapreplace(self.slowPages, (seconds, word))
+
+	# adds on a profile from a part of the run done elsewhere (by a worker)
+	def add(self, other):
+		for mine, theirs in ((self.functions, other.functions), (self.templates, other.templates), (self.sections, other.sections)):
+			for name, (calls, seconds) in theirs.items():
+				counts = mine.setdefault(name, [0, 0.0])
+				counts[0] += calls
+				counts[1] += seconds
+		for page in other.slowPages:
+			if(len(self.slowPages) < self.slowPageCount):
+				heapq.heappush(self.slowPages, page)
+			elif(self.slowPageCount and page > self.slowPages[0]):
+				heapq.heapreplace(self.slowPages, page)
+
+	def report(self, rows=profileReportRows):
+		lines = []
+		for title, table, counted in (('Functions', self.functions, 'calls'), ('Definition templates', self.templates, 'calls'),
+			('Sections', self.sections, 'headers')):
+			if(not table):
+				continue
+			lines.append(title + ':')
+			for name, (calls, seconds) in sorted(table.items(), key=lambda item: item[1][1], reverse=True)[:rows]:
+				lines.append('\t' + name + ' - ' + str(round(seconds, 3)) + 's, ' + str(calls) + ' ' + counted + ', ' +
+					str(round(seconds / calls * 1e6, 1) if calls else 0.0) + 'us each')
+		if(self.slowPages):
+			lines.append('Slowest pages:')
+			for seconds, word in sorted(self.slowPages, reverse=True):
+				lines.append('\t' + word + ' - ' + str(round(seconds * 1000, 2)) + 'ms')
+		return '\n'.join(lines)
+
+	__str__ = report
+
+# number of the most common definition templates a run's stats list
+templateReportCount = 10
+
+# what a run has done - parse() returns one when it finishes, and the progress callback gets one while it's running
+class ParseStats():
+	def __init__(self, inputSize=0):
+		self.output = None	# the output as a string, when not streaming
+		self.stopped = False	# if the run was stopped before it reached the end of the dump
+		self.pagesRead = 0	# pages read from the dump (not counting meta pages)
+		self.pagesSaved = 0	# pages written to the output
+		self.pagesCarried = 0	# pages copied over from an earlier run's output by update()
+		self.linesRead = 0
+		self.bytesRead = 0	# bytes of XML read (after decompressing)
+		self.charsWritten = 0	# characters of output written
+		self.inputSize = inputSize	# size of the dump's file
+		self.inputStart = 0	# where in the dump's file the run started
+		self.inputDone = 0	# how far into the dump's file the run is
+		self.readTime = 0.0	# seconds spent reading the dump and splitting it into pages (or waiting on workers)
+		self.parseTime = 0.0	# seconds spent parsing pages, added up across workers
+		self.writeTime = 0.0	# seconds spent writing pages out
+		self.elapsed = 0.0	# seconds since the run started
+		self.warnings = cl.Counter()	# number of each kind of warning about the dump's content
+		self.cache = cl.Counter()	# hits and misses of the normalization caches, as '<function> hits'/'<function> misses'
+		self.templates = cl.Counter()	# number of definitions starting with each template, handled or not
+		# the queues between the stages of a pipelined run, by name - see PipelineQueue.info
+		self.queues = {}
+		self.profile = None	# where the run spent its time, when it's profiled - a RunProfile
+
+	# adds on the counts from a part of the run done elsewhere (by a worker)
+	def add(self, other):
+		self.pagesRead += other.pagesRead
+		self.linesRead += other.linesRead
+		self.bytesRead += other.bytesRead
+		self.parseTime += other.parseTime
+		self.warnings.update(other.warnings)
+		self.cache.update(other.cache)
+		self.templates.update(other.templates)
+		if(self.profile and other.profile):
+			self.profile.add(other.profile)
+
+	def pagesSkipped(self):
+		return self.pagesRead - self.pagesSaved
+
+	def pagesPerSecond(self):
+		return self.pagesRead / self.elapsed if self.elapsed else 0.0
+
+	def megabytesPerSecond(self):
+		return self.bytesRead / 1e6 / self.elapsed if self.elapsed else 0.0
+
+	# fraction of the dump's file that's been read
+	def progress(self):
+		return min(self.inputDone / self.inputSize, 1.0) if self.inputSize else 0.0
+
+	# estimated seconds until the end of the dump - None until there's something to go off
+	def eta(self):
+		done = self.inputDone - self.inputStart
+		if(done <= 0 or not self.elapsed):
+			return None
+		return max(self.inputSize - self.inputDone, 0) * self.elapsed / done
+
+	def __str__(self):
+		lines = [
+			'Read ' + str(self.pagesRead) + ' pages (' + str(self.linesRead) + ' lines, ' + str(self.bytesRead) + ' bytes) in ' +
+				str(round(self.elapsed, 2)) + 's - ' + str(round(self.pagesPerSecond())) + ' pages/s, ' +
+				str(round(self.megabytesPerSecond(), 2)) + ' MB/s.',
+			'Saved ' + str(self.pagesSaved) + ' pages as ' + str(self.charsWritten) + ' characters, skipped ' + str(self.pagesSkipped()) + '.',
+			'Reading took ' + str(round(self.readTime, 2)) + 's, parsing ' + str(round(self.parseTime, 2)) +
+				's, writing ' + str(round(self.writeTime, 2)) + 's.']
+		if(self.pagesCarried):
+			lines.append('Carried over ' + str(self.pagesCarried) + ' unchanged pages.')
+		lines.extend(self.counterLines())
+		if(self.queues):
+			lines.append('Queues: ' + ', '.join(name + ' ' + str(round(info[1] * 100)) + '% full on average (' +
+				str(round(info[2], 2)) + 's waiting for room, ' + str(round(info[3], 2)) + 's waiting for pages)'
+				for name, info in self.queues.items()) + '.')
+		if(self.templates):
+			lines.append('Definition templates: ' + ', '.join(name + ('' if name in defTemplates else ' (no handler)') + ' x' +
+				str(count) for name, count in self.templates.most_common(templateReportCount)) + '.')
+		if(self.profile):
+			lines.append(self.profile.report())
+		return '\n'.join(lines)
+
+	# lines about the normalization caches and warnings, when there's anything to say about them
+	def counterLines(self):
+		lines = []
+		if(self.cache):
+			names = sorted(set(key.rsplit(' ', 1)[0] for key in self.cache))
+			lines.append('Cache: ' + ', '.join(name + ' ' + str(self.cache[name + ' hits']) + ' hits/' +
+				str(self.cache[name + ' misses']) + ' misses' for name in names) + '.')
+		if(self.warnings):
+			lines.append('Warnings: ' + ', '.join(kind + ' x' + str(count) for kind, count in self.warnings.most_common()) + '.')
+		return lines
+
 class WiktionaryParser():
 	def __init__(self, inpath, outpath):
 		self.__inpath = inpath	# input XML file's path
@@ -279,13 +2607,15 @@ class WiktionaryParser():
 		self.__oneSect = len(self.__targetSections) == 1
 		# if info about plurals should be tracked
 		self.__trackPlurals = True
+		# if the forms of verbs (third person, participles, past) and adjectives (comparative, superlative) should be tracked
+		self.__trackInflections = True
 		# if definitions should be tracked
 		self.__trackDefinitions = True
 		# if definition labels should be tracked
 		self.__trackDefLabels = True
 		# if parser is currently running
 		self.__running = False
-		# if parser should track info about how much data it has parsed
+		# if parser should print a summary of what it did once it's done
 		self.__trackSelf = True
 		# if parser should make a list of words and nothing else
 		self.__wordsOnly = False
@@ -293,15 +2623,268 @@ class WiktionaryParser():
 		self.__skipLines = 0
 		# if parser should track derived terms
 		self.__trackDerived = True
+		# if parser should track synonyms
+		self.__trackSynonyms = True
+		# if parser should track the words "Plural of X"/"Alternate form of X" definitions are forms of
+		self.__trackFormOf = True
+		# number of processes to parse with - more than 1 requires a multistream bz2 dump
+		self.__workers = 1
+		# path of the multistream dump's index - None to guess it from the input path
+		self.__streamIndex = None
+		# if pages should be written out as soon as they're parsed, instead of all at once at the end
+		self.__streamOutput = False
+		# format of the output - one of outputFormats (word lists are always plain text)
+		self.__outputFormat = 'json'
+		# if pages should be checked for target language/section headers before being parsed
+		self.__prefilter = False
+		# header patterns the prefilter looks for in the current run (None to not check)
+		self.__langFilter = None
+		self.__sectFilter = None
+		# seconds between checkpoints of a streaming run - None to not write any
+		self.__checkpointInterval = None
+		# what the current run has done so far
+		self.__stats = ParseStats()
+		# called with the current run's ParseStats every progressInterval seconds - None for no progress updates
+		self.__progressCallback = None
+		self.__progressInterval = 1.0
+		# number of results kept by the caches in front of removeFormatting and handleLabels - 0 for no caching
+		self.__cacheSize = 0
+		# where the current run is up to in the dump, as given by dumpPosition - None when not known
+		self.__position = (0, 0)
+		# the dump being read by the current serial run
+		self.__inf = None
+		# checkpoint the next run should resume from
+		self.__resumeFrom = None
+		# path of the manifest of page ids and revisions written alongside the output - None to not write one
+		self.__manifestPath = None
+		# path of the index of inflected forms to the words they're forms of, written alongside the output - None to not write one
+		self.__lemmaIndexPath = None
+		# path of the graph of relations between words, written alongside the output - None to not write one
+		self.__relationGraphPath = None
+		# (output, manifest) paths of the earlier run the next run should update
+		self.__updateFrom = None
+		# how to split the output into shards - one of shardKeys, a function of (language, section), or None for one output
+		self.__shardBy = None
+		# batches each queue between the reader, parser and writer holds when they run in threads of their own - 0 to not
+		self.__pipelineQueueSize = 0
+		# numbers of the namespaces whose pages should be parsed - pages in any other are skipped without being read through
+		self.__namespaces = defaultNamespaces
+		# where the current run gets its pages when it's parsed together with other parsers - None when it reads the dump itself
+		self.__pageFeed = None
+		# if runs should be profiled, and where to write a cProfile file of them - None to not write one
+		self.__profiling = False
+		self.__profilePath = None
+		# number of the slowest pages a profiled run lists
+		self.__slowPageCount = defaultSlowPageCount
+		# the current run's profile, when it's being profiled
+		self.__profile = None
+
+	def isTrackingSelf(self):
+		return self.__trackSelf
+
+	def setTrackSelf(self, track):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__trackSelf = track
+		return True
+
+	def getProgressCallback(self):
+		return self.__progressCallback
+
+	# sets a function to call with the run's ParseStats every interval seconds while parsing -
+	# its progress() and eta() say how far through the dump the run is
+	def setProgressCallback(self, callback, interval=1.0):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__progressCallback = callback
+		self.__progressInterval = interval
+		return True
+
+	def isProfiling(self):
+		return self.__profiling
+
+	def getProfilePath(self):
+		return self.__profilePath
+
+	# sets if runs should be profiled - the stats they return then have a RunProfile of where the time went, by function,
+	# definition template and section, and the slowest pages, which is printed with them. With a path, a cProfile file
+	# of the run (as read by pstats, snakeviz or flameprof) is written there too - it only covers this thread, so
+	# not the workers, or the reader and writer of a pipelined run.
+	def setProfiling(self, profiling, path=None, slowPages=defaultSlowPageCount):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__profiling = profiling
+		self.__profilePath = path
+		self.__slowPageCount = slowPages
+		return True
+
+	def isPipelined(self):
+		return self.__pipelineQueueSize > 0
+
+	# reads/decompresses the dump, parses it and writes the output in three threads at once, passing pages between them
+	# through queues holding up to queueSize batches. A stage that gets too far ahead waits for the next to catch up.
+	def setPipelined(self, pipelined, queueSize=defaultPipelineQueueSize):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__pipelineQueueSize = queueSize if pipelined else 0
+		return True
+
+	def getNamespaces(self):
+		return set(self.__namespaces)
+
+	# sets which namespaces' pages to parse, by number or by name (see namespaceNumbers) - 0 or 'Main' is where the entries are
+	def setNamespaces(self, *namespaces):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		try:
+			self.__namespaces = frozenset(namespaceNumbers[ns] if isinstance(ns, str) else ns for ns in namespaces)
+		except KeyError as e:
+			print('Unknown namespace ' + str(e) + '!')
+			return None
+		return True
+
+	def getNormalizationCacheSize(self):
+		return self.__cacheSize
+
+	def setNormalizationCacheSize(self, size):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__cacheSize = size
+		return True
+
+	def getSkipLines(self):
+		return self.__skipLines
+
+	def setSkipLines(self, num):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__skipLines = num
+		return True
+
+	def getWorkers(self):
+		return self.__workers
+
+	def setWorkers(self, count):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__workers = count
+		return True
+
+	def getStreamIndex(self):
+		return self.__streamIndex
+
+	def setStreamIndex(self, path):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__streamIndex = path
+		return True
+
+	def isPrefiltering(self):
+		return self.__prefilter
+
+	def setPrefilter(self, prefilter):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__prefilter = prefilter
+		return True
+
+	def getCheckpointInterval(self):
+		return self.__checkpointInterval
+
+	# sets how often (in seconds) a streaming run records a checkpoint it can be resumed from - None for never
+	def setCheckpointInterval(self, seconds):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__checkpointInterval = seconds
+		return True
+
+	def getCheckpointPath(self):
+		return self.__outpath + '.checkpoint'
+
+	def getShardBy(self):
+		return self.__shardBy
+
+	# splits the output into a file per language ('language'), section ('section') or both ('language-section'),
+	# all written in one pass. A function of (language, section) that returns a key (or None to leave the section
+	# out) can be given instead. Each key's output goes to the output path with the key in place of {}
+	# (or before the extension, if there's no {}). Only works for whole pages, not words only.
+	def setShardBy(self, by):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		if(by is not None and by not in shardKeys and not callable(by)):
+			print('Unknown way to shard: ' + str(by))
+			return None
+		self.__shardBy = by
+		return True
+
+	def getManifestPath(self):
+		return self.__manifestPath
+
+	# sets where to write a manifest of every page's id and revision - needed to update the output from a newer dump later
+	def setManifestPath(self, path):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__manifestPath = path
+		return True
 
-	def getSkipLines(self):
-		return 0
+	def getLemmaIndexPath(self):
+		return self.__lemmaIndexPath
 
-	def setSkipLines(self, num):
+	# sets where to write a lemma index - a hash table file of every plural and verb/adjective form saved, to the words
+	# they're forms of - for looking forms up with LemmaIndex. Forms are only indexed when their pages are saved.
+	def setLemmaIndexPath(self, path):
 		if(self.__running):
 			print('Cannot change settings while running!')
 			return None
-		self.__skipLines = num
+		self.__lemmaIndexPath = path
+		return True
+
+	def getRelationGraphPath(self):
+		return self.__relationGraphPath
+
+	# sets where to write a relation graph - a file of the derived terms, synonyms and forms ("Plural of X") of every word
+	# saved, for following them with RelationGraph. Relations are only added when their pages are saved.
+	def setRelationGraphPath(self, path):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__relationGraphPath = path
+		return True
+
+	def isStreamingOutput(self):
+		return self.__streamOutput
+
+	def setStreamOutput(self, stream):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__streamOutput = stream
+		return True
+
+	def getOutputFormat(self):
+		return self.__outputFormat
+
+	def setOutputFormat(self, fmt):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		if(fmt not in outputFormats and fmt not in databaseFormats):
+			print('Unknown output format: ' + str(fmt))
+			return None
+		self.__outputFormat = fmt
 		return True
 
 	def getInPath(self):
@@ -382,6 +2965,16 @@ class WiktionaryParser():
 		self.__trackPlurals = track
 		return True
 
+	def isTrackingInflections(self):
+		return self.__trackInflections
+
+	def setTrackInflections(self, track):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__trackInflections = track
+		return True
+
 	def isTrackingDerived(self):
 		return self.__trackDerived
 
@@ -392,6 +2985,26 @@ class WiktionaryParser():
 		self.__trackDerived = track
 		return True
 
+	def isTrackingSynonyms(self):
+		return self.__trackSynonyms
+
+	def setTrackSynonyms(self, track):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__trackSynonyms = track
+		return True
+
+	def isTrackingFormOf(self):
+		return self.__trackFormOf
+
+	def setTrackFormOf(self, track):
+		if(self.__running):
+			print('Cannot change settings while running!')
+			return None
+		self.__trackFormOf = track
+		return True
+
 	def isTrackingDefinition(self):
 		return self.__trackDefinitions
 
@@ -434,34 +3047,14 @@ class WiktionaryParser():
 			print('Can\'t stop if not running!')
 			return False
 
-	def parse(self):
-		# prevent stupidity
-		if(self.__running):
-			print('Failed to run. This parser is already running!')
-			return None
-		self.__running = True
-
-		# the XML file being read
-		inf = None
-		try:
-			inf = open(self.__inpath, 'r')
-		except:
-			print('Failed to open input file. Quitting...')
-			return None
-
-		for i in range(self.__skipLines):
-			inf.readline()
-
-		if(self.__skipLines):
-			print('Skipped ' + str(self.__skipLines) + ' lines')
-
-		pageCount = 0	# number of saved pages
-		# holds all pages - one page per word
-		pages = '' if self.__wordsOnly else cl.OrderedDict()
-		page = cl.OrderedDict()	# holds the current page being parsed/created
-
-		hasContent = False	# if current page has any content that should be saved
-		currentWord = None	# the actual word as a string
+	# runs a page's lines through the language/section state machine -
+	# returns the page's data, or None if the page has nothing worth saving
+	def __parsePage(self, currentWord, lines):
+		profile = self.__profile
+		# a page with just the one target section holds that section's contents - a list, for a list section
+		newSection = list if self.__oneSect and not self.__targetSections.isdisjoint(listSects) else dict
+		page = newSection() if self.__oneLang else {}	# holds the page being parsed/created
+		hasContent = False	# if the page has any content that should be saved
 
 		# HEIRARCHY: word/page (eg: cat) > language (eg: English) > section (eg: Noun) > contents (eg: definitions)
 		currentLang = None	# dict of a language's sections
@@ -473,8 +3066,8 @@ class WiktionaryParser():
 		inPOS = None	# currently in a Part of Speech section
 		currentDefs = None
 
-		# bool - rules have been found in the current section
-		foundPlurals = False
+		# bool - the current section's headword template (plural rules, verb or adjective forms) has been found
+		foundHeadword = False
 
 		# bool - the whole page should be skipped
 		skipPage = False
@@ -483,301 +3076,1034 @@ class WiktionaryParser():
 		# bool - the whole section should be skipped
 		skipSection = False
 
-		linesRead = 0
-		bytesRead = 0
-
-		while (pageCount < self.__maxPageCount):
-			if(not self.__running):
-				print('Stopping forcefully...')
-				break
+		for line in lines:
+			line = line.decode('utf-8').strip()
+			# if stripped line is empty, it's just an empty line
+			if(not line):
+				continue
 
-			line = inf.readline()
+			# sometimes, important content leaks onto the back of this xml line;
+			# scrap the line, save the, content, and proceed with it
+			if(line.startswith('<text xml:space="preserve">')):
+				line = line[27:]
+				#... unless there isn't actually content
+				if(not line):
+					continue
 
-			if(self.__trackSelf):
-				linesRead += 1
-				bytesRead += len(line.decode('utf8'))
+			# skip the whole page
+			if(skipPage):
+				continue
 
-			# if line is empty, end of file has been reached
-			if(not line):
-				print('Reached end of file.')
-				break
+			# if lang ended
+			if(line == '----'):
+				currentLang = None
+				currentLangName = None
+				currentSectDepth = 0
+				currentPOS = None
+				currentPOSName = None
+				continue
 
-			line = line.strip()
-			# if stripped line is empty, it's just an empty line
-			if(line):
-				# lines with XML formatting only contain relevant information in -
-				# specific cases, which are contained in this IF
-				if(line[0] == '<'):
-					# if a word's page has ended, just assume there's another page after it
-					if(line == '</page>'):
-						# only save pages/words that have desired information
-						if(hasContent):
-							# add word data to the compiled list
-							if(self.__wordsOnly):
-								pages += currentWord + '\n'
-							else:
-								pages[currentWord] = page
+			# skip the whole language
+			if(skipLang):
+				continue
 
-							pageCount += 1
-						# reset some variables
-						hasContent = False
-						currentLang = None
+			# if not currently in a language section, check to see if a new one started
+			if(currentLangName == None):
+				# check if this is a language title
+				match = title2PT.match(line)
+				if(match):
+					if(profile):
+						profile.enterSection(None)
+					# if it is a language title, extract the language
+					# (names are interned, since every page repeats them)
+					lang = sys.intern(match.group(1))
+					# check if this language is desired
+					if((not self.__targetLangs) or (lang in self.__targetLangs)):
+						currentLangName = lang
+						if(self.__wordsOnly):
+							continue
+						# if there's only one language, skip creating a -
+						# lang section and enter info right into the page dict.
+						# This is a really sketchy way to do this, but it's efficient and it works.
+						if(self.__oneLang):
+							currentLang = page
+						else: # otherwise, if there are multiple langs:
+							# create a dict for this language's sections
+							currentLang = newSection()
+							# add the language section to the word's page
+							page[lang] = currentLang
+					else:
 						currentLangName = None
-						currentName = None
-						currentSection = None
-						currentSectionName = None
-						# inPOS = None
-						# currentDefs = None
-						foundPlurals = False
-						skipPage = False
-						skipLang = False
-						skipSection = False
-
-						# next line contains the start of the next page,
-						# which we'll assume will always be there
-						nxt = inf.readline()
-
-						# on the off chance (1 in >6 million) that this is the last page...
-						if(nxt.strip() != '<page>'):
-							print('Reached end of file.')
-							break
-
-						# the next next line contains the word inside a <title>
-						# extract the word from the <title> s
-						currentWord = inf.readline()[11:-9]
-
-						# skip meta pages
-						if(':' in currentWord):
-							skipPage = True
+						if(self.__wordsOnly):
 							continue
+						currentLang = None
+						# if the language isn't desired, skip it
+						skipLang = True
+				# if not in a lang, don't bother checking for sections
+				continue
 
-						# set up the next word's page
-						if(not self.__wordsOnly):
-							page = cl.OrderedDict()
-
+			# check if this is a section title
+			match = title3pPT.match(line)
+			if(match):
+				# if it is a section title, extract the section type
+				section = sys.intern(match.group(1))
+				if(profile):
+					profile.enterSection(section)
+				# check if this section is desired
+				if((not self.__targetSections) or (section in self.__targetSections)):
+					currentSectionName = section
+					if(self.__wordsOnly):
+						# if this word has the desired section and we're only-
+						# looking for words, then this page is done
+						hasContent = True
+						skipPage = True
 						continue
 
-					# sometimes, important content leaks onto the back of this xml line;
-					# scrap the line, save the, content, and proceed with it
-					elif(line.startswith('<text xml:space="preserve">')):
-						line = line[27:]
-						#... unless there isn't actually content
-						if(not line):
-							continue
+					if(self.__oneSect):
+						currentSection = currentLang
+					else:
+						# create a dict for this section's contents
+						currentSection = currentLang.get(section, list() if currentSectionName in listSects else {})
+						# add the section to the language dict
+						currentLang[section] = currentSection
 
-				# skip the whole page
-				if(skipPage):
-					continue
+					inPOS = section in partsOfSpeech
+					currentPOS = section
+					currentPOSName = currentSection
+					if(self.__trackDefinitions):
+						# just assume that any part of speech sections have definitions in them
+						if(inPOS):
+							if('defs' in currentSection.keys()):
+								currentDefs = currentSection['defs']
+							else:
+								currentDefs = list()
+								currentSection['defs'] = currentDefs
+					# flag the page as having desired content
+					hasContent = True
+				else:
+					currentSectionName = None
+					if(self.__wordsOnly):
+						continue
+					currentSection = None
+					# if the section isn't desired, skip it
+					skipSection = True
+				# reset the flag for whether or not the headword template has been found
+				foundHeadword = False
+				continue
 
-				# if lang ended
-				if(line == '----'):
-					currentLang = None
-					currentLangName = None
-					currentSectDepth = 0
-					currentPOS = None
-					currentPOSName = None
-					continue
+			if(self.__wordsOnly):
+				continue
 
-				# skip the whole language
-				if(skipLang):
-					continue
+			# grab definitions
+			if(currentSectionName and inPOS and line[0] == '#' and (self.__trackDefinitions or self.__trackFormOf)):
+				# definition format # {{lb/lbl|en|...}} def1
+				wikiLine = WikiLine(line)
+				parts = definitionParts(wikiLine)
+				if(parts and self.__trackFormOf):
+					# keep the word a "Plural of X" definition points to - {kind: [words]}
+					link = formOfLink(wikiLine, parts[1])
+					if(link):
+						kind, target = link
+						formsOf = currentSection.get('formOf')
+						if(formsOf is None):
+							currentSection['formOf'] = {kind: [target]}
+						elif(target not in formsOf.setdefault(kind, [])):
+							formsOf[kind].append(target)
+				if(parts and self.__trackDefinitions):
+					labels, defStart = parts
+					cleanDefResults = cleanDef(wikiLine, defStart, self.__stats.templates)
+					cleanedDef = cleanDefResults[0]
 
-				# if not currently in a language section, check to see if a new one started
-				if(currentLangName == None):
-					# check if this is a language title
-					match = title2PT.match(line)
-					if(match):
-						# if it is a language title, extract the language
-						lang = match.group(1)
-						# check if this language is desired
-						if((not self.__targetLangs) or (lang in self.__targetLangs)):
-							currentLangName = lang
-							if(self.__wordsOnly):
-								continue
-							# if there's only one language, skip creating a -
-							# lang section and enter info right into the page dict.
-							# This is a really sketchy way to do this, but it's efficient and it works.
-							if(self.__oneLang):
-								currentLang = page
-							else: # otherwise, if there are multiple langs:
-								# create a dict for this language's sections
-								currentLang = cl.OrderedDict()
-								# add the language section to the word's page
-								page[lang] = currentLang
-						else:
-							currentLangName = None
-							if(self.__wordsOnly):
-								continue
-							currentLang = None
-							# if the language isn't desired, skip it
-							skipLang = True
-					# if not in a lang, don't bother checking for sections
-					continue
+					# cleaned labels being sent to output
+					outLabels = cleanDefResults[1]
 
-				# check if this is a section title
-				match = title3pPT.match(line)
-				if(match):
-					# if it is a section title, extract the section type
-					section = match.group(1)
-					# check if this section is desired
-					if((not self.__targetSections) or (section in self.__targetSections)):
-						currentSectionName = section
-						if(self.__wordsOnly):
-							# if this word has the desired section and we're only-
-							# looking for words, then this page is done
-							hasContent = True
-							skipPage = True
-							continue
+					if(labels):
+						outLabels.extend(handleLabels(labels))
 
-						if(self.__oneSect):
-							currentSection = currentLang
-						else:
-							# create a dict for this section's contents
-							currentSection = currentLang.get(section, list() if currentSectionName in listSects else cl.OrderedDict())
-							# add the section to the language dict
-							currentLang[section] = currentSection
-
-						inPOS = section in partsOfSpeech
-						currentPOS = section
-						currentPOSName = currentSection
-						if(self.__trackDefinitions):
-							# just assume that any part of speech sections have definitions in them
-							if(inPOS):
-								if('defs' in currentSection.keys()):
-									currentDefs = currentSection['defs']
-								else:
-									currentDefs = list()
-									currentSection['defs'] = currentDefs
-						# flag the page as having desired content
-						hasContent = True
+					if(self.__trackDefLabels):
+						currentDefs.append(Definition(internLabels(outLabels) if outLabels else None, cleanedDef))
 					else:
-						currentSectionName = None
-						if(self.__wordsOnly):
-							continue
-						currentSection = None
-						# if the section isn't desired, skip it
-						skipSection = True
-					# reset the flag for whether or not plural rules have been found
-					foundPlurals = False
-					continue
+						currentDefs.append(cleanedDef)
 
-				if(self.__wordsOnly):
-					continue
+			if(currentSectionName == 'Noun'):
+				# check for plural rules if necessary
+				# currently locked to English only... other languages have different plural rules.
+				if(self.__trackPlurals and not foundHeadword and currentLangName == 'English'):
+					# try to match the plural rules line
+					plurlabels = pluralArgs(WikiLine(line))
+					if(plurlabels):
+						# if plural rules line is found, extract the labels
+						numPlurlabels = len(plurlabels)
 
-				# grab definitions
-				if(currentSectionName and self.__trackDefinitions and inPOS):
-					# regex match for definition format {{lb/lbl|en|...}} def1 or
-					match = defre1.match(line)
-					if(match):
-						cleanDefResults = cleanDef(match.group('def'))
-						cleanedDef = cleanDefResults[0]
-
-						# cleaned labels being sent to output
-						outLabels = cleanDefResults[1]
-
-						labels = match.group('labels')
-						if(labels):
-							outLabels.extend(handleLabels(labels))
-
-						if(self.__trackDefLabels):
-							defLabelCombo = cl.OrderedDict()
-							if(outLabels):
-								defLabelCombo['labels'] = outLabels
-							defLabelCombo['def'] = cleanedDef
-							currentDefs.append(defLabelCombo)
+						# converts plural notation to actual plural words
+						solvedPlurs = []
+
+						# is word countable?
+						# 0: no, 1: yes, 2: maybe
+						countable = 0
+						 # default rule en-noun - add an s
+						if(numPlurlabels == 1):
+							countable = 1
+							solvedPlurs.append(currentWord + 's')
 						else:
-							currentDefs.append(cleanedDef)
-
-				if(currentSectionName == 'Noun'):
-					# check for plural rules if necessary
-					# currently locked to English only... other languages have different plural rules.
-					if(self.__trackPlurals and not foundPlurals and currentLangName == 'English'):
-						# try to match the plural rules line
-						match = plrre.match(line)
-						if(match):
-							# if plural rules line is found, extract the labels
-							plurlabels = labelify(match.group(0))
-							numPlurlabels = len(plurlabels)
-
-							# converts plural notation to actual plural words
-							solvedPlurs = []
-
-							# is word countable?
-							# 0: no, 1: yes, 2: maybe
-							countable = 0
-							 # default rule en-noun - add an s
-							if(numPlurlabels == 1):
-								countable = 1
-								solvedPlurs.append(currentWord + 's')
-							else:
-								# remove the ISO-noun label
-								plurlabels.pop(0)
-								numPlurlabels -= 1
-								for i in range(numPlurlabels):
-									rule = plurlabels[i]
-									if(rule == 's'):
+							# remove the ISO-noun label
+							plurlabels.pop(0)
+							numPlurlabels -= 1
+							for i in range(numPlurlabels):
+								rule = plurlabels[i]
+								if(rule == 's'):
+									solvedPlurs.append(currentWord + 's')
+									# do not change if countable = sometimes
+									if(countable == 0):
+										countable = 1
+								elif(rule == 'es'):
+									solvedPlurs.append(currentWord + 'es')
+									# do not change if countable = sometimes
+									if(countable == 0):
+										countable = 1
+								elif(rule == '~'): # sometimes countable
+									countable = 2
+									# if ~ is the only label, assume plural is +s
+									if(numPlurlabels == 1):
 										solvedPlurs.append(currentWord + 's')
-										# do not change if countable = sometimes
-										if(countable == 0):
-											countable = 1
-									elif(rule == 'es'):
-										solvedPlurs.append(currentWord + 'es')
-										# do not change if countable = sometimes
-										if(countable == 0):
-											countable = 1
-									elif(rule == '~'): # sometimes countable
+								elif(rule == '-'): # non-countable or rarely countable
+									if(countable == 1):
 										countable = 2
-										# if ~ is the only label, assume plural is +s
-										if(numPlurlabels == 1):
-											solvedPlurs.append(currentWord + 's')
-									elif(rule == '-'): # non-countable or rarely countable
-										if(countable == 1):
-											countable = 2
-									elif(rule == '?'): # unknown plural form
-										countable = 3
-									else:
-										# do not change if countable = sometimes
-										if(countable == 0):
-											countable = 1
-										solvedPlurs.append(rule)
-
-							currentSection['countable'] = countableTypes[countable]
-
-							# solvedPlurs will be falsy if a - causes it to be None
-							if(solvedPlurs):
-								solvedPlurs = [removeFormatting(plur) for plur in solvedPlurs]
-								currentSection['plural'] = solvedPlurs
-							continue
-				elif(currentSectionName == 'Verb'):
-					pass
-				elif(currentSectionName == 'Adjective'):
-					pass
-				elif(currentSectionName == 'Derived terms'):
-					if(self.__trackDerived):
-						if(line[0] == '|'):
-							currentSection.append(removeFormatting(line[1:]))
-						elif(line[0] == '*'):
-							# TODO
-							currentSection.append(removeFormatting(line[1:]))
-
-		inf.close()
-
-		out = pages[:-1] if self.__wordsOnly else json.dumps(pages, separators=(',', ':'))
+								elif(rule == '?'): # unknown plural form
+									countable = 3
+								else:
+									# do not change if countable = sometimes
+									if(countable == 0):
+										countable = 1
+									solvedPlurs.append(rule)
+
+						currentSection['countable'] = countableTypes[countable]
+
+						# solvedPlurs will be falsy if a - causes it to be None
+						if(solvedPlurs):
+							solvedPlurs = [removeFormatting(plur) for plur in solvedPlurs]
+							currentSection['plural'] = solvedPlurs
+						continue
+			elif(currentSectionName == 'Verb'):
+				# expand the verb's forms from its headword template - English only, like plurals
+				if(self.__trackInflections and not foundHeadword and currentLangName == 'English'):
+					args = headwordArgs(WikiLine(line), verbTemplatePT)
+					if(args and args[0] == 'en-verb'):
+						currentSection.update(verbForms(currentWord, args[1:]))
+						foundHeadword = True
+						continue
+			elif(currentSectionName == 'Adjective'):
+				if(self.__trackInflections and not foundHeadword and currentLangName == 'English'):
+					args = headwordArgs(WikiLine(line), adjectiveTemplatePT)
+					if(args and args[0] == 'en-adj'):
+						currentSection.update(adjectiveForms(currentWord, args[1:]))
+						foundHeadword = True
+						continue
+			elif(currentSectionName == 'Derived terms'):
+				if(self.__trackDerived):
+					if(line[0] in '|*{'):
+						currentSection.extend(listedTerms(line))
+			elif(currentSectionName == 'Synonyms'):
+				# listed the same way as derived terms - * {{l|en|feline}}
+				if(self.__trackSynonyms):
+					if(line[0] in '|*{'):
+						currentSection.extend(listedTerms(line))
+
+		return page if hasContent else None
+
+	# parses a page's raw lines - returns the page's data, or None if the page has nothing worth saving
+	def __parseRaw(self, word, lines):
+		langFilter = self.__langFilter
+		sectFilter = self.__sectFilter
+		# pages without any of the headers being looked for can't have content - skip them before decoding anything
+		if(langFilter or sectFilter):
+			text = b''.join(lines)
+			if((langFilter and not langFilter.search(text)) or (sectFilter and not sectFilter.search(text))):
+				return None
+		return self.__parsePage(word, lines)
+
+	# parses pages from a (title, lines) iterator - yields (title, page data or None, revision) in dump order.
+	# The revision is the page's (id, sha1) when a manifest is being written, otherwise None.
+	def __parsePages(self, rawPages):
+		revisions = self.__manifestPath is not None
+		stats = self.__stats
+		profile = self.__profile
+		clock = time.perf_counter
+		for word, lines in rawPages:
+			stats.pagesRead += 1
+			stats.linesRead += len(lines)
+			start = clock()
+			if(profile):
+				profile.startPage(start)
+			page = self.__parseRaw(word, lines)
+			end = clock()
+			stats.parseTime += end - start
+			if(profile):
+				profile.endPage(word, end, end - start)
+			yield (word, page, pageRevision(lines) if revisions else None)
+
+	# builds the header patterns the prefilter looks for - a page can only have content if it has
+	# a ==Language== header for a target language and a ===Section=== header for a target section
+	def __buildPrefilter(self):
+		self.__langFilter = None
+		self.__sectFilter = None
+		if(not self.__prefilter):
+			return
+		if(self.__targetLangs):
+			self.__langFilter = headerPattern(b'==', self.__targetLangs)
+		# section headers are common enough that looking for a long list of them rarely rules a page out
+		if(self.__targetSections and len(self.__targetSections) <= prefilterMaxSections):
+			self.__sectFilter = headerPattern(b'=', self.__targetSections)
+
+	# reads and parses the dump from start to finish in this process.
+	# When pipelined, the dump is read in a thread of its own - its queue is added to queues.
+	def __parseSerial(self, queues, inf):
+		# parsed together with other parsers - they share one read of the dump
+		feed = self.__pageFeed
+		if(feed):
+			try:
+				for result in self.__parsePages(self.__readBatches(feed)):
+					yield result
+			finally:
+				feed.stop()
+				self.__stats.readTime = feed.readTime
+			return
+
+		if(self.__position == (0, 0)):
+			for i in range(self.__skipLines):
+				inf.readline()
+
+			if(self.__skipLines):
+				print('Skipped ' + str(self.__skipLines) + ' lines')
+
+		self.__stats.inputStart = dumpFileOffset(inf)
+		# word lists only need the headers, which the scanner finds without splitting pages up
+		if(self.__wordsOnly):
+			try:
+				for result in self.__scanWords(inf):
+					yield result
+			finally:
+				self.__stats.inputDone = dumpFileOffset(inf)
+				inf.close()
+			return
+
+		if(self.__pipelineQueueSize):
+			reader = PageReader(inf, self.__namespaces, self.__pipelineQueueSize)
+			queues['pages'] = reader.queue
+			try:
+				for result in self.__parsePages(self.__readBatches(reader)):
+					yield result
+			finally:
+				reader.stop()
+				self.__stats.readTime = reader.readTime
+				inf.close()
+			return
 
+		self.__inf = inf
 		try:
-			outf = open(self.__outpath, 'w')
-			outf.write(out)
-			outf.close()
+			for result in self.__parsePages(readPages(inf, self.__namespaces)):
+				yield result
+		finally:
+			self.__stats.bytesRead = inf.tell()
+			self.__stats.inputDone = dumpFileOffset(inf)
+			self.__inf = None
+			inf.close()
+
+	# yields the pages a PageReader reads, keeping track of where in the dump they're up to as they go.
+	# The reader is ahead of the parser, so a checkpoint can only be taken once every page of a batch has been handled.
+	def __readBatches(self, reader):
+		stats = self.__stats
+		for pages, position, bytesRead, offset in reader.batches():
+			last = len(pages) - 1
+			for i in range(len(pages)):
+				self.__position = position if i == last else None
+				if(i == last):
+					stats.bytesRead = bytesRead
+					stats.inputDone = offset
+				yield pages[i]
+
+	# finds the words for a words only run with a WordScanner - yields (title, {} or None, revision) in dump order,
+	# the same as parsing the pages would
+	def __scanWords(self, inf):
+		stats = self.__stats
+		scanner = WordScanner(inf, self.__namespaces, self.__targetLangs, self.__targetSections, self.__manifestPath is not None)
+		for word, found, revision in scanner.pages():
+			stats.pagesRead += 1
+			stats.linesRead = scanner.lines
+			stats.bytesRead = scanner.end
+			try:
+				self.__position = dumpPosition(inf, scanner.end)
+			except ValueError:
+				self.__position = None
+			yield (word, {} if found else None, revision)
+
+	# makes a page index of the input dump at indexPath, for use with lookup - returns the number of pages indexed.
+	# Works on plain XML and bz2 dumps; lookups are fast on a multistream bz2, slow on a single-stream one.
+	def buildIndex(self, indexPath):
+		if(self.__running):
+			print('Cannot index while running!')
+			return None
+
+		titles = []
+		values = []
+		try:
+			with open(self.__inpath, 'rb') as f:
+				magic = f.read(6)
+			if(magic.startswith(tuple(m for m, opener in otherCompressedMagics))):
+				print('Indexing needs a plain XML or bz2 dump.')
+				return None
+			kind = pageIndexBz2 if magic.startswith(bz2Magic) else pageIndexPlain
+			with openDump(self.__inpath) as inf:
+				for word, start, end in findPages(inf, self.__namespaces):
+					streamOffset, offset = dumpPosition(inf, start)
+					titles.append(word.encode('utf-8'))
+					values.append((streamOffset, offset, end - start))
+		except:
+			print('Failed to read input file.')
+			return None
+
+		try:
+			writeSortedTable(indexPath, pageIndexMagic, kind, titles, pageIndexFormat, values)
+		except:
+			print('Failed to write index file.')
+			return None
+		print('Indexed ' + str(len(titles)) + ' pages.')
+		return len(titles)
+
+	# looks a single word up using an index made by buildIndex - seeks straight to the word's page and parses it alone.
+	# Returns the word's data (the same as it would be in parse()'s output), or None if the word isn't there or has nothing to save.
+	def lookup(self, word, indexPath):
+		try:
+			index = SortedTable(indexPath, pageIndexMagic, pageIndexFormat)
+		except:
+			print('Failed to open index file.')
+			return None
+		i = index.find(word.encode('utf-8'))
+		kind = index.info
+		position = index.value(i) if i >= 0 else None
+		index.close()
+		if(position is None):
+			return None
+
+		streamOffset, offset, length = position
+		with open(self.__inpath, 'rb') as f:
+			if(kind == pageIndexBz2):
+				data = readStream(f, streamOffset, offset + length)[offset:offset + length]
+			else:
+				f.seek(offset)
+				data = f.read(length)
+
+		self.__buildPrefilter()
+		setNormalizationCache(self.__cacheSize)
+		self.__stats = ParseStats()
+		for title, page, revision in self.__parsePages(readPages(io.BufferedReader(io.BytesIO(data)), self.__namespaces)):
+			# hand back plain data rather than the parser's records
+			return None if page is None else json.loads(json.dumps(page, default=pageJSON))
+		return None
+
+	# parses every page in a byte range of whole bz2 streams of a multistream dump -
+	# returns ([(title, page data, revision)...], ParseStats). This is the worker side of parallel parsing.
+	def parseStreamRange(self, start, end):
+		with open(self.__inpath, 'rb') as f:
+			f.seek(start)
+			data = bz2.decompress(f.read(end - start))
+		self.__stats = ParseStats()
+		setNormalizationCache(self.__cacheSize)
+		warnings = cl.Counter(warningCounts)
+		cacheInfo = normalizationCacheInfo()
+		# a worker profiles its own share of the run
+		self.__profile = None
+		if(self.__profiling):
+			self.__profile = self.__stats.profile = profiling.profile = RunProfile(self.__slowPageCount)
+		# pages with nothing to save only need sending back when they're going in the manifest
+		keepAll = self.__manifestPath is not None
+		try:
+			if(self.__wordsOnly):
+				pages = self.__scanWords(io.BytesIO(data))
+			else:
+				pages = self.__parsePages(readPages(io.BufferedReader(io.BytesIO(data)), self.__namespaces))
+			results = [result for result in pages if keepAll or result[1] is not None]
+		finally:
+			if(self.__profile):
+				profiling.profile = None
+				self.__profile = None
+		self.__stats.bytesRead = len(data)
+		self.__stats.warnings = warningCounts - warnings
+		self.__stats.cache = normalizationCacheInfo() - cacheInfo
+		return (results, self.__stats)
+
+	# hands groups of bz2 streams to a process pool, yielding their results back in dump order
+	# the (start, end) byte ranges of groups of bz2 streams a parallel run hands its workers - None if the dump or its
+	# stream index can't be read, or the run can't be done in parallel
+	def __streamChunks(self):
+		indexPath = self.__streamIndex or defaultStreamIndex(self.__inpath)
+		try:
+			with open(self.__inpath, 'rb') as f:
+				isBz2 = f.read(3) == b'BZh'
+				size = f.seek(0, 2)
+			offsets = readStreamIndex(indexPath)
+		except:
+			print('Failed to open input file or stream index. Quitting...')
+			return None
+		if(not isBz2 or not offsets):
+			print('Parallel parsing needs a multistream .bz2 dump and its index. Quitting...')
+			return None
+		if(self.__skipLines):
+			print('Skipping lines is not supported when parsing in parallel.')
+
+		# when resuming, start from the stream the checkpoint is at
+		streamOffset, offset = self.__position
+		if(offset):
+			print('This checkpoint is partway through a bz2 stream, so it can only be resumed without workers. Quitting...')
+			return None
+		offsets = [o for o in offsets if o >= streamOffset]
+		offsets.append(size)
+		return [(offsets[i], offsets[min(i + streamsPerTask, len(offsets) - 1)])
+			for i in range(0, len(offsets) - 1, streamsPerTask)]
+
+	def __parseParallel(self, chunks):
+		self.__stats.inputStart = chunks[0][0] if chunks else 0
+		pool = mp.Pool(self.__workers, initStreamWorker, (self,))
+		try:
+			for chunk, (results, stats) in zip(chunks, pool.imap(parseStreamWorker, chunks)):
+				self.__stats.add(stats)
+				self.__stats.inputDone = chunk[1]
+				# a checkpoint can only be taken once every page of a group has been handled
+				for i in range(len(results)):
+					self.__position = (chunk[1], 0) if i == len(results) - 1 else None
+					yield results[i]
+		finally:
+			pool.terminate()
+
+	# reads the dump alongside the output and manifest of an earlier run on an older dump -
+	# pages whose revision hasn't changed are carried over from the old output instead of being parsed again
+	def __parseUpdate(self, inf, prevOutPath, prevManifestPath):
+		prevPages = readManifest(prevManifestPath)
+		prevOutput = readOutput(prevOutPath, None if self.__wordsOnly else self.__outputFormat)
+
+		# both dumps are in page id order, so they can be walked through side by side.
+		# Pages that are out of order just fail to match and get parsed, so the output is right either way.
+		prev = None
+		merging = True	# false once the old run can't be relied on
+		stats = self.__stats
+		clock = time.perf_counter
+		self.__inf = inf
+		try:
+			prev = next(prevPages, None)
+			for word, lines in readPages(inf, self.__namespaces):
+				stats.pagesRead += 1
+				stats.linesRead += len(lines)
+				revision = pageRevision(lines)
+				pageId, sha1 = revision
+				if(merging and pageId is not None):
+					try:
+						# old pages that come before this one aren't in the new dump anymore - and ones without an id
+						# can't be matched, so they're passed over too (they're parsed again if they're still there)
+						while(prev and (prev[0] is None or prev[0] < pageId)):
+							if(prev[2]):
+								next(prevOutput)
+							prev = next(prevPages, None)
+						if(prev and prev[0] == pageId):
+							oldId, oldSha1, kept, oldWord = prev
+							text = None
+							if(kept):
+								word2, text = next(prevOutput)
+								if(word2 != oldWord):
+									raise ValueError
+							prev = next(prevPages, None)
+							if(sha1 is not None and sha1 == oldSha1 and word == oldWord):
+								stats.pagesCarried += 1
+								yield (word, PreviousPage(text) if kept else None, revision)
+								continue
+					except (ValueError, StopIteration):
+						print('The earlier run\'s output doesn\'t match its manifest - parsing the rest of the dump in full.')
+						merging = False
+				start = clock()
+				page = self.__parseRaw(word, lines)
+				stats.parseTime += clock() - start
+				yield (word, page, revision)
+		except (OSError, ValueError):
+			print('Failed to read the earlier run. Quitting...')
+		finally:
+			stats.bytesRead = inf.tell()
+			stats.inputDone = dumpFileOffset(inf)
+			self.__inf = None
+			inf.close()
+			prevPages.close()
+			prevOutput.close()
+
+	# updates the output of an earlier run (made with a manifest) to a newer dump - only pages that were
+	# added or edited since are parsed, and pages that were deleted are dropped. The settings should be the
+	# same as the earlier run's, and the output and manifest paths different from its.
+	def update(self, prevOutPath, prevManifestPath):
+		if(self.__running):
+			print('Failed to run. This parser is already running!')
+			return None
+		if(prevOutPath == self.__outpath or prevManifestPath == self.__manifestPath):
+			print('The updated output and manifest need different paths to the earlier run\'s.')
+			return None
+		try:
+			open(prevOutPath, 'rb').close()
+			open(prevManifestPath, 'rb').close()
+		except:
+			print('Failed to open the earlier run\'s output or manifest. Quitting...')
+			return None
+		if(self.__shardBy or self.__outputFormat in databaseFormats):
+			print('Only unsharded JSON output can be updated.')
+			return None
+		if(self.__workers > 1):
+			print('Updates are read without workers.')
+		self.__updateFrom = (prevOutPath, prevManifestPath)
+		# updates always stream their output, whatever the parser's set to
+		return self.__parse(True)
+
+	# records where a streaming run is up to, so it can be picked up from there by resume() -
+	# returns False if the run isn't at a point a checkpoint can be taken from
+	def __writeCheckpoint(self, output, outf, pageCount, manifest):
+		position = dumpPosition(self.__inf) if self.__inf else self.__position
+		if(position is None):
+			return False
+		# a pipelined writer could still have pages that belong before the checkpoint
+		if(type(output) is PipelineWriter):
+			output.wait()
+		outf.flush()
+		checkpoint = {'input': list(position), 'pages': pageCount, 'output': outf.tell()}
+		if(manifest):
+			manifest.flush()
+			checkpoint['manifest'] = manifest.tell()
+		path = self.getCheckpointPath()
+		try:
+			with open(path + '.tmp', 'w') as f:
+				json.dump(checkpoint, f)
+			os.replace(path + '.tmp', path)
+		except:
+			print('Failed to write checkpoint.')
+		return True
+
+	# picks a streaming run that was stopped or crashed back up from its last checkpoint -
+	# the dump is read from where the checkpoint was taken, and the output is appended to
+	def resume(self):
+		if(self.__running):
+			print('Failed to run. This parser is already running!')
+			return None
+		try:
+			with open(self.getCheckpointPath()) as f:
+				self.__resumeFrom = json.load(f)
+		except:
+			print('Failed to read checkpoint. Quitting...')
+			return None
+		print('Resuming from page ' + str(self.__resumeFrom['pages']) + '.')
+		# the output's appended to, so a resumed run always streams, whatever the parser's set to
+		return self.__parse(True)
+
+	def parse(self):
+		return self.__parse(self.__streamOutput)
+
+	# starts a run - streamOutput is whether this run streams its output, which update() and resume() always do
+	def __parse(self, streamOutput):
+		# prevent stupidity
+		if(self.__running):
+			print('Failed to run. This parser is already running!')
+			return None
+
+		# a profiled run times the functions pages are parsed with on this thread (workers time their own), and the
+		# cProfile file covers the whole run. Both stop however the run ends.
+		profiler = None
+		if(self.__profiling):
+			if(profiling.profile):
+				print('Another run is being profiled, so this one won\'t be.')
+			else:
+				self.__profile = profiling.profile = RunProfile(self.__slowPageCount)
+				if(self.__profilePath):
+					profiler = cProfile.Profile()
+					try:
+						profiler.enable()
+					except ValueError:
+						print('Something else is profiling this run, so no cProfile file will be written.')
+						profiler = None
+		try:
+			return self.__run(streamOutput)
+		finally:
+			if(self.__profile):
+				if(profiler):
+					profiler.disable()
+					try:
+						profiler.dump_stats(self.__profilePath)
+					except OSError:
+						print('Failed to write profile.')
+				profiling.profile = None
+				self.__profile = None
+
+	# the run parse() starts
+	def __run(self, streamOutput):
+		self.__running = True
+
+		clock = time.perf_counter
+		started = clock()
+		try:
+			inputSize = os.path.getsize(self.__inpath)
 		except:
-			print('Failed to write to file.')
+			inputSize = 0
+		stats = ParseStats(inputSize)
+		stats.profile = self.__profile
+		self.__stats = stats
+		# parsed together with other parsers, the cache is set up for all of them, and what's shared between them is
+		# counted by parseTogether
+		if(not self.__pageFeed):
+			setNormalizationCache(self.__cacheSize)
+		warnings = cl.Counter(warningCounts)
+		cacheInfo = normalizationCacheInfo()
+		self.__buildPrefilter()
+
+		resume = self.__resumeFrom
+		self.__resumeFrom = None
+		update = self.__updateFrom
+		self.__updateFrom = None
+		self.__position = tuple(resume['input']) if resume else (0, 0)
+		pageCount = resume['pages'] if resume else 0	# number of saved pages
+		startCount = pageCount
+
+		# the dump is opened before anything's written, so a run that can't read it leaves earlier output alone -
+		# workers open it themselves, so a parallel run just checks it can be split up for them
+		parallel = self.__workers > 1 and not update and not self.__pageFeed
+		inf = None
+		chunks = None
+		if(parallel):
+			chunks = self.__streamChunks()
+			if(chunks is None):
+				self.__running = False
+				return None
+		elif(not self.__pageFeed):
+			try:
+				inf = openDump(self.__inpath, position=self.__position)
+			except:
+				print('Failed to open input file. Quitting...')
+				self.__running = False
+				return None
+
+		database = self.__outputFormat in databaseFormats
+		sharding = self.__shardBy is not None
+		if(sharding and (self.__wordsOnly or database)):
+			print('Only whole pages written as JSON can be sharded.')
+			sharding = False
+		# sharded and database output look after their own files, and are always streamed
+		ownOutput = sharding or database
+		# word lists are short enough to go straight to the output, even when it's kept in memory
+		streaming = streamOutput or ownOutput or self.__wordsOnly
+
+		# when streaming, pages go straight to the output file as they're parsed -
+		# otherwise they're held in memory and written once the parse is done
+		outf = None
+		if(ownOutput):
+			if(resume):
+				print('Only unsharded JSON runs can be resumed. Quitting...')
+				if(inf):
+					inf.close()
+				self.__running = False
+				return None
+		elif(streamOutput):
+			try:
+				if(resume):
+					# drop anything written after the checkpoint
+					os.truncate(self.__outpath, resume['output'])
+				outf = open(self.__outpath, 'a' if resume else 'w', encoding='utf-8', buffering=writeBufferSize)
+			except:
+				print('Failed to open output file. Quitting...')
+				if(inf):
+					inf.close()
+				self.__running = False
+				return None
+		else:
+			outf = io.StringIO()
+
+		# every page read goes in the manifest, saved or not, in the same order as the output
+		manifest = None
+		if(self.__manifestPath):
+			try:
+				if(resume and 'manifest' in resume):
+					os.truncate(self.__manifestPath, resume['manifest'])
+				manifest = open(self.__manifestPath, 'a' if resume else 'w', encoding='utf-8', buffering=writeBufferSize)
+			except:
+				print('Failed to open manifest file. Quitting...')
+				if(outf):
+					outf.close()
+				if(inf):
+					inf.close()
+				self.__running = False
+				return None
+		# pages leave out the language/section level when there's only one
+		onlyLang = next(iter(self.__targetLangs)) if self.__oneLang else None
+		onlySect = next(iter(self.__targetSections)) if self.__oneSect else None
+		if(database):
+			try:
+				writer = databaseFormats[self.__outputFormat](self.__outpath, onlyLang, onlySect)
+			except (OSError, sqlite3.Error):
+				print('Failed to create output database. Quitting...')
+				if(manifest):
+					manifest.close()
+				if(inf):
+					inf.close()
+				self.__running = False
+				return None
+		elif(self.__wordsOnly):
+			writer = WordListWriter(outf, pageCount > 0)
+		elif(sharding):
+			keyFn, fixesLang, fixesSect = shardKeys.get(self.__shardBy, (self.__shardBy, False, False))
+			writer = ShardWriter(self.__outpath, outputFormats[self.__outputFormat], keyFn, fixesLang, fixesSect, onlyLang, onlySect)
+		else:
+			writer = outputFormats[self.__outputFormat](outf, pageCount > 0)
+
+		# every page saved goes in the lemma index and relation graph, which are written once the run's done -
+		# (writer, what it is, what closing it returns the number of)
+		indexes = []
+		for path, writerType, name, counted in ((self.__lemmaIndexPath, LemmaIndexWriter, 'lemma index', 'forms'),
+			(self.__relationGraphPath, RelationGraphWriter, 'relation graph', 'relations')):
+			if(not path):
+				continue
+			if(self.__wordsOnly):
+				print('Word lists have nothing to put in a ' + name + '.')
+			elif(resume):
+				print('Resumed runs don\'t write a ' + name + ' - it would be missing the pages saved before the checkpoint.')
+			else:
+				indexes.append((writerType(path, onlyLang, onlySect), name, counted))
+
+		# the queues between stages, when pipelined - the writer works in a thread of its own, and so does the reader
+		# when the dump is read serially
+		queues = {}
+		output = writer
+		if(self.__pipelineQueueSize):
+			output = PipelineWriter(writer, self.__pipelineQueueSize)
+			queues['output'] = output.queue
+
+		checkpointing = False
+		if(self.__checkpointInterval):
+			if(update):
+				print('Checkpoints aren\'t written while updating.')
+			elif(ownOutput):
+				print('Checkpoints are only written for unsharded JSON output.')
+			elif(streamOutput):
+				checkpointing = True
+				nextCheckpoint = started + self.__checkpointInterval
+			else:
+				print('Checkpoints are only written when streaming output.')
+
+		progress = self.__progressCallback
+		nextProgress = started + self.__progressInterval
+
+		if(update):
+			results = self.__parseUpdate(inf, *update)
+		else:
+			results = self.__parseParallel(chunks) if parallel else self.__parseSerial(queues, inf)
+
+		# holds all pages - one page per word (only when not streaming)
+		pages = {}
+
+		stopped = False
+		waitTime = 0.0	# time spent waiting for pages to come out of results
+		last = clock()
+		for word, page, revision in results:
+			now = clock()
+			waitTime += now - last
+			if(pageCount >= self.__maxPageCount):
+				break
+			if(manifest):
+				pageId, sha1 = revision
+				manifest.write(('' if pageId is None else str(pageId)) + '\t' + (sha1 or '') + '\t' +
+					('0' if page is None else '1') + '\t' + word + '\n')
+			# only save pages/words that have desired information
+			if(page is not None):
+				for index, name, counted in indexes:
+					if(type(page) is PreviousPage):
+						index.addRaw(word, page.text)
+					else:
+						index.add(word, page)
+				# add word data to the output
+				if(type(page) is PreviousPage):
+					output.writeRaw(word, page.text)
+				elif(streaming):
+					output.write(word, page)
+				else:
+					pages[word] = page
+
+				pageCount += 1
+			last = clock()
+			stats.writeTime += last - now
+
+			if(checkpointing and last >= nextCheckpoint):
+				if(self.__writeCheckpoint(output, outf, pageCount, manifest)):
+					nextCheckpoint = clock() + self.__checkpointInterval
+
+			if(progress and last >= nextProgress):
+				stats.pagesSaved = pageCount - startCount
+				stats.charsWritten = output.size
+				stats.elapsed = last - started
+				stats.queues = {name: queues[name].info() for name in ('pages', 'output') if name in queues}
+				if(self.__inf):
+					stats.bytesRead = self.__inf.tell()
+					stats.inputDone = dumpFileOffset(self.__inf)
+				progress(stats)
+				last = clock()
+				nextProgress = last + self.__progressInterval
+
+			if(not self.__running):
+				print('Stopping forcefully...')
+				stopped = True
+				# a stopped run can be resumed right where it left off
+				if(checkpointing):
+					self.__writeCheckpoint(output, outf, pageCount, manifest)
+				break
+		else:
+			print('Reached end of file.')
+		results.close()
+
+		start = clock()
+		for word, page in pages.items():
+			output.write(word, page)
+		output.close()
+		if(manifest):
+			manifest.close()
+		for index, name, counted in indexes:
+			try:
+				print('Wrote a ' + name + ' of ' + str(index.close()) + ' ' + counted + '.')
+			except OSError:
+				print('Failed to write ' + name + '.')
+		stats.writeTime += clock() - start
+		if(output is not writer):
+			# the writes happened alongside everything else - the time that counts is the writer's own
+			stats.writeTime = output.writeTime
+
+		if(ownOutput):
+			if(sharding):
+				print('Wrote ' + str(len(writer.shards)) + ' shards.')
+		elif(streamOutput):
+			outf.close()
+			# a finished run has nothing to resume
+			if(checkpointing and not stopped and os.path.exists(self.getCheckpointPath())):
+				os.remove(self.getCheckpointPath())
+		else:
+			stats.output = outf.getvalue()
+			try:
+				outf = open(self.__outpath, 'w', encoding='utf-8')
+				outf.write(stats.output)
+				outf.close()
+			except:
+				print('Failed to write to file.')
 
 		# end stats
-		print('Finished with ' + str(len(pages)) + ' words.')
+		stats.stopped = stopped
+		stats.pagesSaved = pageCount - startCount
+		stats.charsWritten = writer.size
+		stats.elapsed = clock() - started
+		stats.queues = {name: queues[name].info() for name in ('pages', 'output') if name in queues}
+		# with workers, parsing happens while this process waits for them - and a pipelined reader keeps its own time
+		if(parallel):
+			stats.readTime = waitTime
+		elif(update or ('pages' not in queues and not self.__pageFeed)):
+			stats.readTime = max(waitTime - stats.parseTime, 0.0)
+		if(not parallel and not self.__pageFeed):
+			stats.warnings = warningCounts - warnings
+			stats.cache = normalizationCacheInfo() - cacheInfo
+		print('Finished with ' + str(pageCount) + ' words.')
 		if(self.__trackSelf):
-			print('Parsed ' + str(linesRead) + ' lines.')
-			print('Turned ' + str(bytesRead) + ' bytes into ' + str(len(out.decode('utf8'))) + '.')
+			print(stats)
+
+		self.__running = False
+		return stats
+
+	# runs several parsers over the same dump in one pass - the dump is read, decompressed and split into pages once,
+	# and every page goes to each parser, which parses and writes it out with its own settings as parse() would.
+	# Making K outputs this way costs one read of the dump instead of K. Returns (each parser's ParseStats (None for
+	# any that failed to run) in the order given, a ParseStats of what they shared). The parsers run in threads of their
+	# own, so their parsing doesn't overlap. Warnings and the normalization cache can't be told apart between them, so
+	# they're counted once, in the shared stats, along with the time spent reading the dump - the cache is as big as the
+	# biggest any of them asks for. Workers and skipped lines are ignored.
+	@staticmethod
+	def parseTogether(*parsers, queueSize=defaultPipelineQueueSize):
+		if(not parsers):
+			return ([], ParseStats())
+		inpath = parsers[0].__inpath
+		if(any(parser.__inpath != inpath for parser in parsers)):
+			print('Parsers parsed together must read the same dump. Quitting...')
+			return None
+		if(any(parser.__running for parser in parsers)):
+			print('Failed to run. One of the parsers is already running!')
+			return None
+		try:
+			inf = openDump(inpath)
+		except:
+			print('Failed to open input file. Quitting...')
+			return None
+
+		clock = time.perf_counter
+		started = clock()
+		try:
+			inputSize = os.path.getsize(inpath)
+		except:
+			inputSize = 0
+		shared = ParseStats(inputSize)
+		setNormalizationCache(max(parser.__cacheSize for parser in parsers))
+		warnings = cl.Counter(warningCounts)
+		cacheInfo = normalizationCacheInfo()
+
+		feeds = [PageFeed(parser.__namespaces, queueSize) for parser in parsers]
+		results = [None] * len(parsers)
+		def run(i):
+			parser = parsers[i]
+			parser.__pageFeed = feeds[i]
+			try:
+				results[i] = parser.parse()
+			finally:
+				parser.__pageFeed = None
+				feeds[i].stop()
+		threads = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(len(parsers))]
+		for thread in threads:
+			thread.start()
 
-		return out
+		# sends a batch to every feed still taking them - False once none are
+		def send(batch):
+			taken = False
+			for feed in feeds:
+				taken = feed.send(batch) or taken
+			return taken
+
+		namespaces = frozenset().union(*(feed.namespaces for feed in feeds))
+		readTime = 0.0
+		try:
+			batch = []
+			start = clock()
+			for page in readNamespacedPages(inf, namespaces):
+				batch.append(page)
+				if(len(batch) == pipelineBatchSize):
+					readTime += clock() - start
+					for feed in feeds:
+						feed.readTime = readTime
+					# stop reading once every parser's done
+					if(not send((batch, dumpPosition(inf), inf.tell(), dumpFileOffset(inf)))):
+						break
+					batch = []
+					start = clock()
+			else:
+				readTime += clock() - start
+				for feed in feeds:
+					feed.readTime = readTime
+				if(batch):
+					send((batch, dumpPosition(inf), inf.tell(), dumpFileOffset(inf)))
+				send(None)
+		except Exception as e:
+			# each parser finds out when it gets this far
+			send(e)
+		finally:
+			for thread in threads:
+				thread.join()
+			inf.close()
+		shared.readTime = readTime
+		shared.elapsed = clock() - started
+		shared.warnings = warningCounts - warnings
+		shared.cache = normalizationCacheInfo() - cacheInfo
+		if(any(parser.__trackSelf for parser in parsers)):
+			print('\n'.join(['Read the dump once in ' + str(round(shared.elapsed, 2)) + 's - reading took ' +
+				str(round(shared.readTime, 2)) + 's.'] + shared.counterLines()))
+		return (results, shared)
 
 def formatTerms(t):
 	if(t[0] == '{{'):
@@ -787,30 +4113,29 @@ def formatTerms(t):
 
 
 def example():
-	# Everything : Nouns with plurals only : Adjective Words Only	:	Words only
-	exampleTemplate = 1
+	# Everything : Nouns with plurals only : Adjectives : Words only - all made in one pass over the dump
+	inp = '/Users/default/Documents/Wikiparse/wiktionary.xml'
 	outp = '/Users/default/Documents/Wikiparse/'
-	parser = WiktionaryParser('/Users/default/Documents/Wikiparse/wiktionary.xml', None)
-	if(exampleTemplate == 0):
-		parser.setOutPath(outp + 'parsed.json')
-		parser.setMaxPageCount(100)
-	elif(exampleTemplate == 1):
-		parser.setOutPath(outp + 'nounplurs.json')
-		parser.setMaxPageCount(1000000)
-		parser.setTargetSections('Noun')
-		parser.setTrackDefinitions(False)
-		parser.setTrackDerived(False)
-	elif(exampleTemplate == 1):
-		parser.setOutPath(outp + 'adjectives.json')
-		parser.setMaxPageCount(1000000)
-		parser.setTargetSections('Noun')
-		parser.setTrackDefinitions(False)
-		parser.setTrackDerived(False)
-	elif(exampleTemplate == 2):
-		parser.setOutPath(outp + 'wordsonly.txt')
-		parser.setMaxPageCount(5000)
-		parser.setWordsOnly(True)
-	parser.parse()
-	# parser.setTargetSections('Noun')
-
-example()
\ No newline at end of file
+	everything = WiktionaryParser(inp, outp + 'parsed.json')
+	everything.setMaxPageCount(100)
+
+	nounPlurals = WiktionaryParser(inp, outp + 'nounplurs.json')
+	nounPlurals.setMaxPageCount(1000000)
+	nounPlurals.setTargetSections('Noun')
+	nounPlurals.setTrackDefinitions(False)
+	nounPlurals.setTrackDerived(False)
+
+	adjectives = WiktionaryParser(inp, outp + 'adjectives.json')
+	adjectives.setMaxPageCount(1000000)
+	adjectives.setTargetSections('Adjective')
+	adjectives.setTrackDefinitions(False)
+	adjectives.setTrackDerived(False)
+
+	wordsOnly = WiktionaryParser(inp, outp + 'wordsonly.txt')
+	wordsOnly.setMaxPageCount(5000)
+	wordsOnly.setWordsOnly(True)
+
+	WiktionaryParser.parseTogether(everything, nounPlurals, adjectives, wordsOnly)
+
+if __name__ == '__main__':
+	example()
\ No newline at end of file